@@ -13,15 +13,21 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import contextvars
 import mimetypes
 import os
 import re
 import shutil
+import time
+from dataclasses import dataclass
 from typing import Optional
 
+import metrics
+
 from smolagents.agent_types import AgentAudio, AgentImage, AgentText, handle_agent_output_types
 from smolagents.agents import ActionStep, MultiStepAgent
-from smolagents.memory import MemoryStep
+from smolagents.memory import MemoryStep, TaskStep
+from smolagents.models import MessageRole
 from smolagents.utils import _is_package_available
 
 
@@ -140,13 +146,14 @@ def stream_to_gradio(
     total_output_tokens = 0
 
     for step_log in agent.run(task, stream=True, reset=reset_agent_memory, additional_args=additional_args):
-        # Track tokens if model provides them
-        if hasattr(agent.model, "last_input_token_count"):
-            total_input_tokens += agent.model.last_input_token_count
-            total_output_tokens += agent.model.last_output_token_count
-            if isinstance(step_log, ActionStep):
-                step_log.input_token_count = agent.model.last_input_token_count
-                step_log.output_token_count = agent.model.last_output_token_count
+        # Track tokens from the step's own model call: the model may be shared with other agents
+        if isinstance(step_log, ActionStep):
+            input_tokens, output_tokens = metrics.step_token_counts(step_log)
+            if input_tokens is not None:
+                total_input_tokens += input_tokens
+                total_output_tokens += output_tokens or 0
+                step_log.input_token_count = input_tokens
+                step_log.output_token_count = output_tokens or 0
 
         for message in pull_messages_from_step(
             step_log,
@@ -175,29 +182,172 @@ def stream_to_gradio(
         yield gr.ChatMessage(role="assistant", content=f"**Final answer:** {str(final_answer)}")
 
 
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+
+@dataclass
+class SummaryStep(MemoryStep):
+    """Memory entry standing in for compacted turns, sent to the model as a system message.
+
+    A TaskStep would reach the model as "New task:", as if the summary were a request.
+    """
+
+    summary: str
+
+    def to_messages(self, summary_mode: bool = False, **kwargs) -> list:
+        text = f"{SUMMARY_PREFIX}\n{self.summary}"
+        return [{"role": MessageRole.SYSTEM, "content": [{"type": "text", "text": text}]}]
+
+
+def summarize_memory_steps(steps: list, max_tokens: int) -> str:
+    """Condenses memory steps into each user request and its final answer, keeping the most recent lines within `max_tokens`.
+
+    Intermediate steps (tool calls and their outputs) are left out: only the last
+    action of each turn, which holds the final answer, is kept.
+    """
+    from prompt_builder import count_tokens
+
+    lines, answer = [], None
+    for step in steps:
+        if isinstance(step, (SummaryStep, TaskStep)) and answer is not None:
+            lines.append(f"Agent: {answer}")
+            answer = None
+        if isinstance(step, SummaryStep):
+            lines.extend(step.summary.splitlines())
+        elif isinstance(step, TaskStep):
+            lines.append(f"User: {' '.join(step.task.split())}")
+        elif isinstance(step, ActionStep) and step.action_output is not None:
+            answer = " ".join(str(step.action_output).split())
+    if answer is not None:
+        lines.append(f"Agent: {answer}")
+
+    kept, used = [], 0
+    for line in reversed(lines):
+        used += count_tokens(line)
+        if used > max_tokens:
+            break
+        kept.append(line)
+    return "\n".join(reversed(kept))
+
+
+def compact_agent_memory(agent: MultiStepAgent, keep_turns: int, summary_tokens: int = 500) -> int:
+    """Replaces every turn except the last `keep_turns` with a single SummaryStep.
+
+    A turn starts at each TaskStep. Returns how many steps were compacted.
+    """
+    steps = agent.memory.steps
+    turn_starts = [i for i, step in enumerate(steps) if isinstance(step, TaskStep)]
+    if len(turn_starts) <= keep_turns + 1:
+        # Nothing to gain: at most one extra turn to fold into the (possibly) existing summary
+        return 0
+
+    cut = turn_starts[-keep_turns] if keep_turns > 0 else len(steps)
+    old_steps = steps[:cut]
+    summary = summarize_memory_steps(old_steps, summary_tokens)
+    agent.memory.steps = [SummaryStep(summary=summary)] + steps[cut:]
+    return len(old_steps)
+
+
+def iterate_in_context(context: contextvars.Context, generator):
+    """Runs every step of `generator` inside `context`, whichever thread Gradio resumes it on."""
+    while True:
+        try:
+            item = context.run(next, generator)
+        except StopIteration:
+            return
+        yield item
+
+
+def trim_history(messages: list, window: int | None) -> list:
+    """Keeps only the last `window` chat messages on screen."""
+    if window and len(messages) > window:
+        del messages[: len(messages) - window]
+    return messages
+
+
 class GradioUI:
-    """A one-line interface to launch your agent in Gradio"""
+    """A one-line interface to launch your agent in Gradio
+
+    The chat keeps at most `history_window` messages on screen, and before each turn the
+    agent memory is compacted to its last `memory_turns` turns plus a summary of the
+    older ones, so the cost of a turn does not grow with the length of the conversation.
+    With `incremental=True` the current turn streams into its own chatbot and each yield
+    carries only that turn's messages; the history chatbot is updated once, when the
+    turn ends.
 
-    def __init__(self, agent: MultiStepAgent, file_upload_folder: str | None = None):
+    Each turn is recorded in the request metrics under the `metrics_endpoint` label, and
+    the agent's steps (duration, errors and tokens) are labelled with it as well.
+    """
+
+    metrics_endpoint = "gradio"
+
+    def __init__(
+        self,
+        agent: MultiStepAgent,
+        file_upload_folder: str | None = None,
+        history_window: int | None = 50,
+        memory_turns: int | None = 3,
+        summary_tokens: int = 500,
+        incremental: bool = True,
+    ):
         if not _is_package_available("gradio"):
             raise ModuleNotFoundError(
                 "Please install 'gradio' extra to use the GradioUI: `pip install 'smolagents[gradio]'`"
             )
         self.agent = agent
         self.file_upload_folder = file_upload_folder
+        self.history_window = history_window
+        self.memory_turns = memory_turns
+        self.summary_tokens = summary_tokens
+        self.incremental = incremental
+        if metrics.record_agent_step not in self.agent.step_callbacks:
+            self.agent.step_callbacks.append(metrics.record_agent_step)
         if self.file_upload_folder is not None:
             if not os.path.exists(file_upload_folder):
                 os.mkdir(file_upload_folder)
 
     def interact_with_agent(self, prompt, messages):
+        context = contextvars.copy_context()
+        context.run(metrics.set_endpoint, self.metrics_endpoint)
+        start = time.perf_counter()
+        status = "500"
+        try:
+            yield from iterate_in_context(context, self._run_turn(prompt, messages))
+            status = "200"
+        except GeneratorExit:
+            # The user stopped the turn or left the page
+            status = "499"
+            raise
+        finally:
+            metrics.observe(
+                "request_duration_seconds", time.perf_counter() - start, endpoint=self.metrics_endpoint, method="chat"
+            )
+            metrics.inc("requests_total", endpoint=self.metrics_endpoint, status=status)
+
+    def _run_turn(self, prompt, messages):
         import gradio as gr
 
-        messages.append(gr.ChatMessage(role="user", content=prompt))
-        yield messages
-        for msg in stream_to_gradio(self.agent, task=prompt, reset_agent_memory=False):
-            messages.append(msg)
+        if not self.incremental:
+            messages.append(gr.ChatMessage(role="user", content=prompt))
             yield messages
-        yield messages
+            for msg in stream_to_gradio(self.agent, task=prompt, reset_agent_memory=False):
+                messages.append(msg)
+                yield messages
+            yield messages
+            return
+
+        if self.memory_turns is not None:
+            compact_agent_memory(self.agent, self.memory_turns, self.summary_tokens)
+
+        # Outputs are (history, current turn): while streaming the history is left untouched
+        history = trim_history(list(messages), self.history_window)
+        turn = [gr.ChatMessage(role="user", content=prompt)]
+        yield (history if len(history) < len(messages) else gr.skip()), turn
+        for msg in stream_to_gradio(self.agent, task=prompt, reset_agent_memory=False):
+            turn.append(msg)
+            yield gr.skip(), turn
+        # The finished turn moves into the history in a single update
+        yield trim_history(history + turn, self.history_window), []
 
     def upload_file(
         self,
@@ -283,12 +433,17 @@ class GradioUI:
                     [upload_file, file_uploads_log],
                     [upload_status, file_uploads_log],
                 )
+            outputs = [chatbot]
+            if self.incremental:
+                # The turn being streamed gets its own chatbot, so each update only carries that turn
+                current_turn = gr.Chatbot(label="Current turn", type="messages", resizeable=True)
+                outputs.append(current_turn)
             text_input = gr.Textbox(lines=1, label="Chat Message")
             text_input.submit(
                 self.log_user_message,
                 [text_input, file_uploads_log],
                 [stored_messages, text_input],
-            ).then(self.interact_with_agent, [stored_messages, chatbot], [chatbot])
+            ).then(self.interact_with_agent, [stored_messages, chatbot], outputs)
 
         demo.launch(debug=True, share=True, **kwargs)
 
@@ -0,0 +1,213 @@
+"""Controle de admissão por classe de trabalho (OCR, agente/LLM e e-mail) e prazo por requisição.
+
+Cada classe tem um limite de execuções simultâneas e uma fila de espera limitada.
+Com a fila cheia, a requisição é recusada na hora (QueueFull → 429); se a vaga não
+abrir dentro da espera máxima ou do prazo da requisição, ela desiste (AdmissionTimeout
+→ 503). Ambas levam um Retry-After estimado pelo tempo médio de ocupação das vagas.
+
+O prazo da requisição (cabeçalho X-Request-Timeout ou parâmetro 'timeout') fica em
+um ContextVar: passado o prazo o cliente já desistiu, então a espera na fila, os
+passos do agente, as chamadas ao modelo e o OCR são interrompidos (DeadlineExceeded → 504).
+"""
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+
+class AdmissionError(Exception):
+    """Trabalho recusado por sobrecarga ou prazo esgotado."""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: int | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFull(AdmissionError):
+    """A fila de espera da classe está cheia."""
+
+    status_code = 429
+
+
+class AdmissionTimeout(AdmissionError):
+    """Nenhuma vaga abriu dentro da espera máxima."""
+
+    status_code = 503
+
+
+class DeadlineExceeded(AdmissionError):
+    """O prazo da requisição acabou: o cliente já desistiu da resposta."""
+
+    status_code = 504
+
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+def set_deadline(timeout: float | None):
+    """Define o prazo (em segundos a partir de agora) da requisição atual; None remove o prazo."""
+    return _deadline.set(time.monotonic() + timeout if timeout else None)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+def time_left() -> float | None:
+    """Segundos restantes até o prazo da requisição, ou None se não houver prazo."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(step=None):
+    """Lança DeadlineExceeded se o prazo acabou. Serve também como callback de passo do agente."""
+    left = time_left()
+    if left is not None and left <= 0:
+        raise deadline_exceeded()
+
+
+def deadline_exceeded() -> DeadlineExceeded:
+    """Conta a desistência por prazo e devolve a exceção a ser lançada."""
+    metrics.inc("admission_rejected_total", stage="deadline", reason="deadline")
+    return DeadlineExceeded("Prazo da requisição esgotado; o processamento foi interrompido.")
+
+
+@contextmanager
+def unwrapped_admission_errors():
+    """Relança a AdmissionError que o agente embrulhou em outra exceção.
+
+    O smolagents converte os erros do modelo em AgentGenerationError (com a original
+    em `__cause__`); sem isso, um prazo esgotado numa chamada ao LLM viraria um 500.
+    """
+    try:
+        yield
+    except AdmissionError:
+        raise
+    except Exception as e:
+        cause = e.__cause__
+        while cause is not None and not isinstance(cause, AdmissionError):
+            cause = cause.__cause__
+        if cause is None:
+            raise
+        raise cause
+
+
+def without_deadline(fn, *args, **kwargs):
+    """Executa `fn` sem o prazo da requisição (ex.: jobs assíncronos, que sobrevivem a ela)."""
+    token = _deadline.set(None)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _deadline.reset(token)
+
+
+class AdmissionController:
+    """Limite de concorrência com fila de espera limitada para uma classe de trabalho.
+
+    Até `limit` execuções simultâneas; até `queue_size` requisições esperando por
+    no máximo `max_wait` segundos (ou até o prazo da requisição, o que vier antes).
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, max_wait: float):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "timeout": 0, "deadline": 0}
+        # Média móvel (EWMA) do tempo de ocupação de uma vaga, usada no Retry-After
+        self.avg_hold = 1.0
+        self._cond = threading.Condition()
+
+    def retry_after(self) -> int:
+        """Segundos estimados até a fila atual andar."""
+        with self._cond:
+            return self._retry_after()
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.avg_hold * (self.waiting + 1) / self.limit))
+
+    def _reject(self, reason: str, error):
+        self.rejected[reason] += 1
+        metrics.inc("admission_rejected_total", stage=self.name, reason=reason)
+        raise error
+
+    def check(self):
+        """Recusa já (sem reservar vaga) se a fila estiver cheia; útil antes de abrir um stream."""
+        with self._cond:
+            if self.active >= self.limit and self.waiting >= self.queue_size:
+                self._reject("queue_full", QueueFull(self._full_message(), self._retry_after()))
+
+    def _full_message(self) -> str:
+        return f"Fila de {self.name} cheia, tente novamente em instantes."
+
+    def acquire(self):
+        start = time.monotonic()
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                self.admitted += 1
+                return
+            if self.waiting >= self.queue_size:
+                self._reject("queue_full", QueueFull(self._full_message(), self._retry_after()))
+
+            left = time_left()
+            wait_until = start + (self.max_wait if left is None else min(self.max_wait, left))
+            self.waiting += 1
+            try:
+                while self.active >= self.limit:
+                    remaining = wait_until - time.monotonic()
+                    if remaining <= 0:
+                        if left is not None and left <= self.max_wait:
+                            self._reject("deadline", DeadlineExceeded(
+                                "Prazo da requisição esgotado enquanto aguardava na fila."
+                            ))
+                        self._reject("timeout", AdmissionTimeout(
+                            f"Serviço de {self.name} sobrecarregado, tente novamente em instantes.",
+                            self._retry_after(),
+                        ))
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+        metrics.observe("admission_wait_seconds", time.monotonic() - start, stage=self.name)
+
+    def release(self, held: float | None = None):
+        with self._cond:
+            self.active -= 1
+            if held is not None:
+                self.avg_hold = 0.8 * self.avg_hold + 0.2 * held
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        """Ocupa uma vaga durante o bloco, esperando na fila se preciso."""
+        check_deadline()
+        self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "queue_size": self.queue_size,
+                "max_wait": self.max_wait,
+                "active": self.active,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "avg_hold_seconds": round(self.avg_hold, 3),
+                "retry_after": self._retry_after(),
+            }
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import re
+
+from cache import LRUCache, SingleFlight
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza o texto extraído: ignora maiúsculas/minúsculas e diferenças de espaçamento."""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class AgentCache:
+    """Cache de respostas do agente, com TTL e limite de tamanho.
+
+    A chave combina o texto extraído normalizado, o prompt do usuário, o tipo de
+    tarefa, o id do modelo e o hash dos templates de prompt. Requisições idênticas
+    simultâneas aguardam uma única execução do agente.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 3600):
+        self.entries = LRUCache(max_size=max_size, ttl=ttl)
+        self.inflight = SingleFlight()
+        self.bypassed = 0
+
+    @staticmethod
+    def make_key(task: str, extracted_text: str, user_prompt: str, model_id: str, prompts_hash: str) -> str:
+        payload = json.dumps(
+            [task, normalize_text(extracted_text), user_prompt.strip(), model_id, prompts_hash],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        return self.entries.get(key)
+
+    def set(self, key: str, answer):
+        self.entries.set(key, answer)
+
+    def get_or_run(self, key: str, run, refresh: bool = False):
+        """Retorna (resposta, veio_do_cache). Com `refresh=True` ignora o cache e o atualiza.
+
+        `run` devolve (resposta, chave): a resposta é guardada sob a chave devolvida (a
+        do modelo que de fato respondeu), ou não é guardada se a chave for None.
+        """
+        if refresh:
+            self.bypassed += 1
+        else:
+            cached = self.entries.get(key)
+            if cached is not None:
+                return cached, True
+
+        # Só a primeira requisição executa; as idênticas que chegarem nesse meio-tempo recebem a mesma resposta
+        answer, store_key = self.inflight.do(key, run)
+        if store_key is not None:
+            self.entries.set(store_key, answer)
+        return answer, False
+
+    def stats(self) -> dict:
+        return dict(self.entries.stats(), bypassed=self.bypassed, shared=self.inflight.shared)
@@ -0,0 +1,67 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class AgentPoolTimeout(Exception):
+    """Nenhum agente ficou livre dentro do tempo de espera."""
+
+
+class AgentPool:
+    """Pool limitado de agentes: cada requisição usa o seu, com memória limpa.
+
+    Os agentes são criados sob demanda por `factory` (até `size`) e compartilham
+    o que a fábrica compartilhar: clientes de modelo, ferramentas e templates.
+    """
+
+    def __init__(self, factory, size: int = 4, timeout: float = 30):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float | None = None):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self.factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout if timeout is None else timeout)
+        except queue.Empty:
+            raise AgentPoolTimeout("Todos os agentes estão ocupados, tente novamente em instantes.")
+
+    def release(self, agent):
+        # Limpa a memória para que a próxima requisição não herde passos anteriores
+        agent.memory.reset()
+        self._idle.put(agent)
+
+    @contextmanager
+    def agent(self, timeout: float | None = None):
+        agent = self.acquire(timeout)
+        try:
+            yield agent
+        finally:
+            self.release(agent)
+
+    def warmup(self, count: int = 1):
+        agents = [self.acquire() for _ in range(min(count, self.size))]
+        for agent in agents:
+            self.release(agent)
+
+    def stats(self) -> dict:
+        return {"size": self.size, "created": self._created, "idle": self._idle.qsize()}
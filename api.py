@@ -1,19 +1,34 @@
-from flask import Flask, request, jsonify
-from PIL import Image
-import pytesseract
-import io
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+import contextvars
+import json
 import os
-import datetime
-import pytz
-import yaml
-from smolagents import CodeAgent, DuckDuckGoSearchTool, load_tool, tool, LiteLLMModel, HfApiModel
-from tools.final_answer import FinalAnswerTool
 from dotenv import load_dotenv
 from flask_cors import CORS
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
+from ocr_cache import OCRCache
+from ocr_engine import DRAFT_DECODE, OCRQueueFull, get_engine
+from jobs import JobManager, JobQueueFull
+from smtp_pool import SMTPPool
+from concurrent.futures import ThreadPoolExecutor
+from documents import ocr_document, parse_dpi, parse_page_range
+from preprocessing import parse_stages
+from regions import parse_mode
+from agent_cache import AgentCache
+from factories import get_agent_model, get_agent_pool, get_prompts_hash, get_router, init_timings, warm_up
+from routing import routing_context
+from prompt_builder import build_task_prompt
+from listing import extract_listing, format_facts, has_facts
+from agent_pool import AgentPoolTimeout
+from uploads import UploadError, read_attachment_bytes, read_image_upload, read_upload
+from admission import AdmissionController, AdmissionError, QueueFull, set_deadline, reset_deadline, unwrapped_admission_errors, without_deadline
+import metrics
+from search_index import get_search_index
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -27,52 +42,243 @@ EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))  # Conversão segura com valor padrão
 
-# Verificação imediata
+# Verificação na inicialização: apenas avisa; o envio de e-mail falha com erro claro
 if None in [EMAIL_USER, EMAIL_PASSWORD, SMTP_SERVER]:
-    raise ValueError("Variáveis de e-mail essenciais não encontradas no .env")
+    print("Aviso: variáveis de e-mail essenciais não encontradas no .env; envio de e-mail desativado")
+
+# Pool de sessões SMTP autenticadas (conexões abertas sob demanda e reutilizadas)
+smtp_pool = SMTPPool(
+    host=SMTP_SERVER,
+    port=SMTP_PORT,
+    user=EMAIL_USER,
+    password=EMAIL_PASSWORD,
+    size=int(os.getenv("SMTP_POOL_SIZE", "4")),
+    starttls=os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes"),
+)
 
 app = Flask(__name__)
 CORS(app)  # Habilitar CORS para todas as rotas
 
-# Função para extrair texto de uma imagem usando OCR
-def extract_text_from_image(image_stream) -> str:
+# Tamanho máximo do corpo da requisição (o Werkzeug responde 413 antes de ler os arquivos)
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("REQUEST_MAX_BYTES", str(64 * 1024 * 1024)))
+
+@app.errorhandler(413)
+def request_too_large(e):
+    limit = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'error': f'Requisição maior que o limite de {limit} MB.'}), 413
+
+@app.errorhandler(UploadError)
+def upload_error(e):
+    return jsonify({'error': str(e)}), e.status_code
+
+# Controle de admissão: limites e filas separados para OCR, agente/LLM e e-mail (ver admission.py).
+# Por padrão o OCR admite um job por worker, o agente um por agente do pool e o e-mail uma por sessão SMTP.
+ocr_admission = AdmissionController(
+    'ocr',
+    limit=int(os.getenv("ADMISSION_OCR_LIMIT") or get_engine().workers or 1),
+    queue_size=int(os.getenv("ADMISSION_OCR_QUEUE", "32")),
+    max_wait=float(os.getenv("ADMISSION_OCR_MAX_WAIT", "10")),
+)
+agent_admission = AdmissionController(
+    'agent',
+    limit=int(os.getenv("ADMISSION_AGENT_LIMIT") or os.getenv("AGENT_POOL_SIZE", "4")),
+    queue_size=int(os.getenv("ADMISSION_AGENT_QUEUE", "8")),
+    max_wait=float(os.getenv("ADMISSION_AGENT_MAX_WAIT", "15")),
+)
+email_admission = AdmissionController(
+    'email',
+    limit=int(os.getenv("ADMISSION_EMAIL_LIMIT") or os.getenv("SMTP_POOL_SIZE", "4")),
+    queue_size=int(os.getenv("ADMISSION_EMAIL_QUEUE", "16")),
+    max_wait=float(os.getenv("ADMISSION_EMAIL_MAX_WAIT", "10")),
+)
+
+# Prazo padrão por requisição, opcional (0 = sem prazo). Rotas de streaming (SSE) não
+# recebem o padrão: elas enviam o progresso enquanto o agente trabalha e só têm
+# prazo se o cliente pedir um
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT") or "0")
+STREAMING_ENDPOINTS = {'/analyze-image/stream', '/process-image/stream', '/process-document'}
+
+def get_request_timeout(value, endpoint: str = '') -> float | None:
+    # Cabeçalho X-Request-Timeout ou parâmetro 'timeout' na URL; inválido usa o padrão
+    default = 0 if endpoint in STREAMING_ENDPOINTS else REQUEST_TIMEOUT
+    try:
+        timeout = float(value) if value else default
+    except ValueError:
+        timeout = default
+    return timeout if timeout > 0 else None
+
+def overloaded_response(message, status_code, retry_after=None):
+    response = jsonify({'error': message, 'retry_after': retry_after})
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    return response, status_code
+
+@app.errorhandler(AdmissionError)
+def admission_error(e):
+    # Sobrecarga (429/503) ou prazo esgotado (504): resposta imediata, sem ocupar o worker
+    return overloaded_response(str(e), e.status_code, e.retry_after)
+
+# Métricas por endpoint: latência, status e rótulo usado pelos estágios internos
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+    g.metrics_token = metrics.set_endpoint(g.metrics_endpoint)
+    g.deadline_token = set_deadline(get_request_timeout(
+        request.headers.get('X-Request-Timeout') or request.args.get('timeout'), g.metrics_endpoint
+    ))
+
+@app.after_request
+def record_request_metrics(response):
+    if 'metrics_start' in g:
+        start, endpoint, method, status = g.metrics_start, g.metrics_endpoint, request.method, str(response.status_code)
+
+        def record():
+            metrics.observe('request_duration_seconds', time.perf_counter() - start, endpoint=endpoint, method=method)
+            metrics.inc('requests_total', endpoint=endpoint, status=status)
+
+        if response.is_streamed:
+            # SSE: a requisição só termina quando o gerador acaba (ou o cliente desconecta)
+            response.call_on_close(record)
+        else:
+            record()
+    return response
+
+@app.teardown_request
+def reset_request_metrics(exc):
+    if 'metrics_token' in g:
+        metrics.reset_endpoint(g.pop('metrics_token'))
+    if 'deadline_token' in g:
+        reset_deadline(g.pop('deadline_token'))
+
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+
+# Configurações do OCR (fazem parte da chave do cache). A resolução alvo e a
+# decodificação reduzida do JPEG mudam a imagem reconhecida mesmo sem pré-processamento
+OCR_SETTINGS = {
+    "lang": os.getenv("OCR_LANG", "eng"),
+    "config": os.getenv("OCR_CONFIG", ""),
+    "target_dpi": OCR_TARGET_DPI,
+    "draft_decode": DRAFT_DECODE,
+}
+
+# Cache de OCR: LRU em memória + SQLite compartilhado entre workers
+ocr_cache = OCRCache(
+    path=os.getenv("OCR_CACHE_PATH", "ocr_cache.sqlite3"),
+    memory_size=int(os.getenv("OCR_CACHE_MEMORY_SIZE", "256")),
+)
+
+# Pré-processamento padrão (preset ou lista de estágios, ver preprocessing.py)
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "none")
+# Modo de OCR: 'page' (página inteira), 'regions', 'tiles' ou 'auto' (ver regions.py)
+OCR_MODE = parse_mode(os.getenv("OCR_MODE", "page"))
+
+# OCR executado no pool de workers persistentes (ver ocr_engine.py)
+def run_ocr(data: bytes, preprocess=(), report=None, mode: str = 'page') -> str:
+    engine = get_engine()
+    options = dict(
+        lang=OCR_SETTINGS["lang"],
+        config=OCR_SETTINGS["config"],
+        preprocess=preprocess,
+        target_dpi=OCR_TARGET_DPI,
+    )
+    with metrics.timed('ocr'):
+        if mode == 'page':
+            result = engine.ocr(data, **options)
+        else:
+            # Regiões de texto (ou faixas) reconhecidas em paralelo nos workers
+            result = engine.ocr_regions(data, mode=mode, **options)
+
+    # Tempos medidos dentro do worker: decodificação, estágios de pré-processamento e Tesseract
+    for stage, seconds in result['timings'].items():
+        metrics.observe_stage(f'ocr_{stage}', seconds)
+    for stage, ms in result['preprocessing'].items():
+        metrics.observe_stage(f'preprocess_{stage}', ms / 1000)
+
+    if report is not None:
+        report['preprocessing'] = result['preprocessing']
+        report['memory'] = result['memory']
+        if 'regions' in result:
+            report['regions'] = result['regions']
+    return result['text']
+
+# OCR com cache; lança exceção em caso de erro
+def ocr_image_bytes(data: bytes, preprocess=(), report=None, mode: str | None = None) -> str:
+    mode = mode or OCR_MODE
+    settings = OCR_SETTINGS
+    if preprocess:
+        settings = dict(OCR_SETTINGS, preprocess=list(preprocess))
+    if mode != 'page':
+        settings = dict(settings, mode=mode)
+
+    def compute():
+        # Só o OCR de fato passa pela admissão; respostas em cache não esperam na fila
+        with ocr_admission.slot():
+            try:
+                text = run_ocr(data, preprocess, report, mode)
+            except OCRQueueFull as e:
+                raise QueueFull(str(e), ocr_admission.retry_after()) from e
+        # Indexado só quando o OCR roda de fato; a gravação acontece em segundo plano
+        if text:
+            get_search_index().add(
+                OCRCache.make_key(data, settings), 'ocr', text=text, source=metrics.current_endpoint()
+            )
+        return text
+
+    return ocr_cache.get_or_compute(data, settings, compute)
+
+# Prefixo do texto devolvido no lugar do OCR quando ele falha (o agente ainda responde sobre o erro)
+OCR_ERROR_PREFIX = "Erro ao extrair texto: "
+
+# Função para extrair texto de uma imagem (bytes ou arquivo) usando OCR
+def extract_text_from_image(image, preprocess=(), mode: str | None = None, report=None) -> str:
     try:
-        image = Image.open(image_stream)
-        text = pytesseract.image_to_string(image)
-        return text.strip()
+        data = image if isinstance(image, bytes) else image.read()
+        return ocr_image_bytes(data, preprocess, report, mode)
+    except AdmissionError:
+        raise
     except Exception as e:
-        return f"Erro ao extrair texto: {str(e)}"
+        return f"{OCR_ERROR_PREFIX}{str(e)}"
+
+def get_preprocess_stages():
+    # Pipeline escolhido por requisição no campo 'preprocess' (ex.: 'full' ou 'downscale,grayscale')
+    return parse_stages(request.form.get('preprocess', OCR_PREPROCESS))
+
+def get_ocr_mode():
+    # Modo escolhido por requisição no campo 'ocr_mode' (ex.: 'regions' para fotos grandes)
+    return parse_mode(request.form.get('ocr_mode') or OCR_MODE)
+
+def build_email_message(to_email, subject, body, attachment_data=None, attachment_name=None):
+    msg = MIMEMultipart()
+    msg['From'] = EMAIL_USER
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+
+    if attachment_data is not None:
+        part = MIMEApplication(attachment_data, Name=attachment_name)
+        part['Content-Disposition'] = f'attachment; filename="{attachment_name}"'
+        msg.attach(part)
+
+    return msg
 
 def send_email(to_email, subject, body, attachment=None):
+    """`attachment` é um par (bytes, nome do arquivo), lido uma única vez do upload."""
     try:
         # Verificação adicional das variáveis
         if None in [EMAIL_USER, EMAIL_PASSWORD, SMTP_SERVER, SMTP_PORT]:
             raise ValueError("Variáveis de e-mail não configuradas corretamente no .env")
 
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_USER
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-
-        if attachment:
-            attachment.seek(0)  # Reset file pointer
-            part = MIMEApplication(
-                attachment.read(),
-                Name=attachment.filename
-            )
-            part['Content-Disposition'] = f'attachment; filename="{attachment.filename}"'
-            msg.attach(part)
-
-        # Conexão mais robusta com tratamento de timeout
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=10) as server:
-            server.ehlo()
-            server.starttls()
-            server.login(EMAIL_USER, EMAIL_PASSWORD)
-            server.send_message(msg)
-            print(f"E-mail enviado com sucesso para {to_email}")
-            return True
+        msg = build_email_message(to_email, subject, body, *(attachment or (None, None)))
+
+        # Sessão reutilizada do pool (sem novo EHLO/STARTTLS/LOGIN a cada e-mail)
+        with email_admission.slot(), metrics.timed('smtp_send'):
+            smtp_pool.send_message(msg)
+        print(f"E-mail enviado com sucesso para {to_email}")
+        return True
 
+    except AdmissionError:
+        raise
     except smtplib.SMTPAuthenticationError:
         print("Erro de autenticação: Verifique EMAIL_USER e EMAIL_PASSWORD no .env")
         return False
@@ -80,42 +286,150 @@ def send_email(to_email, subject, body, attachment=None):
         print(f"Erro ao enviar e-mail: {str(e)}")
         return False
 
-# Carregar modelos e ferramentas
-final_answer = FinalAnswerTool()
+def send_bulk_email(recipients, subject, body, attachment=None) -> dict:
+    """Envia o mesmo conteúdo para vários destinatários usando uma única sessão SMTP."""
+    attachment_data, attachment_name = attachment or (None, None)
+    messages = [
+        build_email_message(to_email, subject, body, attachment_data, attachment_name)
+        for to_email in recipients
+    ]
+
+    sent, failed = [], {}
+    with email_admission.slot(), metrics.timed('smtp_send_bulk'):
+        results = smtp_pool.send_bulk(messages)
+
+    for msg, error in results:
+        if error is None:
+            sent.append(msg['To'])
+        else:
+            failed[msg['To']] = str(error)
+    return {'sent': sent, 'failed': failed}
 
-model = HfApiModel(
-    max_tokens=2096,
-    temperature=0.5,
-    model_id='Qwen/Qwen2.5-Coder-32B-Instruct',
-    custom_role_conversions=None,
-    token=HG_TOKEN
-)
+# Modelos, ferramentas, templates de prompt e agente são criados sob demanda (ver factories.py)
 
-lite_model = LiteLLMModel(
-    model_id="ollama/deepseek-r1:7b",
-    temperature=0.6, 
-    max_tokens=200
+# Jobs assíncronos para /analyze-image (OCR + agente em segundo plano)
+job_manager = JobManager(
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    queue_size=int(os.getenv("JOB_QUEUE_SIZE", "16")),
+    result_ttl=float(os.getenv("JOB_RESULT_TTL", "600")),
 )
 
-# Importar ferramenta de geração de imagem
-image_generation_tool = load_tool("agents-course/text-to-image", trust_remote_code=True)
-
-# Carregar templates de prompt
-with open("prompts.yaml", 'r') as stream:
-    prompt_templates = yaml.safe_load(stream)
-
-agent = CodeAgent(
-    model=model,
-    tools=[DuckDuckGoSearchTool(), image_generation_tool],
-    max_steps=6,
-    verbosity_level=1,
-    grammar=None,
-    planning_interval=None,
-    name=None,
-    description=None,
-    prompt_templates=prompt_templates
+# Cache de respostas do agente (texto normalizado + prompt + modelo + prompts.yaml)
+agent_cache = AgentCache(
+    max_size=int(os.getenv("AGENT_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("AGENT_CACHE_TTL", "3600")),
 )
 
+def agent_cache_key(task: str, extracted_text: str, user_prompt: str, model_id: str | None) -> str:
+    return AgentCache.make_key(task, extracted_text, user_prompt, model_id, get_prompts_hash())
+
+def planned_model_id(task: str, prompt_tokens: int) -> str | None:
+    # Com roteamento, o modelo depende da tarefa e do tamanho do prompt (ver ModelRouter)
+    model = get_agent_model()
+    planned = getattr(model, 'planned_model_id', None)
+    return planned(task, prompt_tokens) if planned is not None else model.model_id
+
+def answered_model_id(routing: list) -> str | None:
+    # A resposta final vem da última chamada bem-sucedida ao modelo (sem roteamento, o log fica vazio)
+    answered = [entry['model_id'] for entry in routing if entry['ok']]
+    return answered[-1] if answered else get_agent_model().model_id
+
+def listing_fields(task: str, extracted_text: str) -> dict | None:
+    # Área, preço, preço por m², cômodos e endereço extraídos por regras, sem o LLM (só para imóveis)
+    if task != 'analyze-image':
+        return None
+    return extract_listing(extracted_text)
+
+def listing_prompt_facts(listing: dict | None) -> str:
+    return format_facts(listing) if listing and has_facts(listing) else ''
+
+def reached_max_steps(agent) -> bool:
+    # Sem final_answer dentro de max_steps, o smolagents improvisa uma resposta só com a memória
+    from smolagents.utils import AgentMaxStepsError
+
+    steps = agent.memory.steps
+    return bool(steps) and isinstance(getattr(steps[-1], 'error', None), AgentMaxStepsError)
+
+def cacheable_answer(extracted_text: str, agent) -> bool:
+    # Respostas sobre uma falha do OCR ou improvisadas no limite de passos não vão para o cache nem para o índice
+    return not extracted_text.startswith(OCR_ERROR_PREFIX) and not reached_max_steps(agent)
+
+def index_analysis(key: str, task: str, extracted_text: str, user_prompt: str, answer):
+    get_search_index().add(
+        key, 'analysis', text=extracted_text, prompt=user_prompt, answer=str(answer), task=task,
+        source=metrics.current_endpoint(),
+    )
+
+def run_agent_cached(
+    task: str,
+    extracted_text: str,
+    user_prompt: str = '',
+    refresh: bool = False,
+    latency_budget: float | None = None,
+):
+    """Monta o prompt (com orçamento de tokens) e executa o agente, ou devolve a resposta em cache.
+
+    Retorna (resposta, metadados), com 'cached', a contagem de tokens do prompt ('tokens'),
+    o nível de modelo usado em cada chamada ('routing') e, na análise de imóvel, os campos
+    do anúncio extraídos por regras ('listing').
+    """
+    listing = listing_fields(task, extracted_text)
+    full_prompt, tokens = build_task_prompt(task, extracted_text, user_prompt, facts=listing_prompt_facts(listing))
+    # Procura pela resposta do modelo que deve atender; guarda sob o que de fato respondeu
+    key = agent_cache_key(task, extracted_text, user_prompt, planned_model_id(task, tokens['prompt']))
+
+    def run():
+        # Cada requisição usa um agente próprio do pool, com memória limpa; respostas
+        # em cache não passam pela admissão
+        with agent_admission.slot(), get_agent_pool().agent() as agent, metrics.timed('agent_run'):
+            with unwrapped_admission_errors():
+                answer = agent.run(full_prompt)
+            cacheable = cacheable_answer(extracted_text, agent)
+        if not cacheable:
+            return answer, None
+        store_key = agent_cache_key(task, extracted_text, user_prompt, answered_model_id(routing))
+        index_analysis(store_key, task, extracted_text, user_prompt, answer)
+        return answer, store_key
+
+    with routing_context(task, latency_budget) as routing:
+        response, cached = agent_cache.get_or_run(key, run, refresh=refresh)
+    meta = {'cached': cached, 'tokens': tokens, 'routing': routing}
+    if listing is not None:
+        meta['listing'] = listing
+    return response, meta
+
+def analyze_image_job(
+    data: bytes,
+    preprocess=(),
+    refresh: bool = False,
+    latency_budget: float | None = None,
+    mode: str | None = None,
+) -> dict:
+    extracted_text = extract_text_from_image(data, preprocess, mode)
+    if not extracted_text:
+        raise ValueError('Nenhum texto foi extraído da imagem.')
+    response, meta = run_agent_cached('analyze-image', extracted_text, '', refresh, latency_budget)
+    return {'explanation': response, **meta}
+
+def request_flag(name: str) -> bool:
+    value = request.args.get(name) or request.form.get(name) or ''
+    return value.lower() in ('1', 'true', 'yes')
+
+def is_async_request() -> bool:
+    return request_flag('async')
+
+def is_refresh_request() -> bool:
+    # Ignora o cache do agente e força uma nova análise
+    return request_flag('refresh')
+
+def get_latency_budget() -> float | None:
+    # Orçamento de latência (segundos) usado pelo roteador de modelos
+    value = request.args.get('latency_budget') or request.form.get('latency_budget')
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
 @app.route('/analyze-image', methods=['POST'])
 def analyze_image():
     if 'image' not in request.files:
@@ -126,31 +440,52 @@ def analyze_image():
     if image_file.filename == '':
         return jsonify({'error': 'Nome de arquivo inválido.'}), 400
 
+    try:
+        preprocess = get_preprocess_stages()
+        mode = get_ocr_mode()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Um único buffer por upload, validado pelo cabeçalho antes de decodificar
+    data = read_image_upload(image_file)
+
+    if is_async_request():
+        try:
+            # O job sobrevive à requisição, então não herda o prazo dela
+            job_id = job_manager.submit(
+                without_deadline, analyze_image_job, data, preprocess, is_refresh_request(), get_latency_budget(), mode
+            )
+        except JobQueueFull as e:
+            return overloaded_response(str(e), 503, agent_admission.retry_after())
+        return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'}), 202
+
     try:
         # Extrair texto da imagem
-        extracted_text = extract_text_from_image(image_file.stream)
+        extracted_text = extract_text_from_image(data, preprocess, mode)
 
         if not extracted_text:
             return jsonify({'error': 'Nenhum texto foi extraído da imagem.'}), 400
 
         # Analisar o texto usando o agente com o prompt específico
-        prompt = (
-            "Você é um corretor de imóveis e deverá fazer uma avaliação do imóvel com base no seguinte texto extraído: "
-            f"{extracted_text}\n\n"
-            "Por favor, forneça:\n"
-            "1. Uma avaliação detalhada do imóvel\n"
-            "2. Pontos de interesse próximos (escolas, hospitais, comércio, etc.)\n"
-            "3. Preço médio do imóvel e valor por metragem\n"
-            "4. Qualquer observação relevante sobre o imóvel\n\n"
-            "Responda em português brasileiro de forma profissional e detalhada."
+        response, meta = run_agent_cached(
+            'analyze-image', extracted_text, '', is_refresh_request(), get_latency_budget()
         )
-        
-        response = agent.run(prompt)
 
-        return jsonify({'explanation': response}), 200
+        return jsonify({'explanation': response, **meta}), 200
 
+    except AgentPoolTimeout as e:
+        return jsonify({'error': str(e)}), 503
+    except AdmissionError:
+        raise
     except Exception as e:
         return jsonify({'error': f'Ocorreu um erro ao processar a imagem: {str(e)}'}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado ou expirado.'}), 404
+    return jsonify(job), 200
     
 @app.route('/process-image', methods=['POST'])
 def process_image():
@@ -164,37 +499,338 @@ def process_image():
         return jsonify({'error': 'Nome de arquivo inválido.'}), 400
 
     try:
-        # Extrair texto da imagem
-        extracted_text = extract_text_from_image(image_file.stream)
+        preprocess = get_preprocess_stages()
+        mode = get_ocr_mode()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    data = read_image_upload(image_file)
+    try:
+        # Extrair texto da imagem (com tempos do pré-processamento e memória usada no OCR)
+        report = {}
+        try:
+            extracted_text = ocr_image_bytes(data, preprocess, report, mode)
+        except AdmissionError:
+            raise
+        except Exception as e:
+            extracted_text = f"{OCR_ERROR_PREFIX}{str(e)}"
 
         if not extracted_text:
             return jsonify({'result': ''}), 200  # Sem texto extraído
 
         # Analisar com o agente apenas se houver prompt
         if user_prompt.strip():
-            full_prompt = f"Texto extraído da imagem: {extracted_text}\n\nPergunta do usuário: {user_prompt}"
-            response = agent.run(full_prompt)
+            response, meta = run_agent_cached(
+                'process-image', extracted_text, user_prompt, is_refresh_request(), get_latency_budget()
+            )
             result = response
         else:
             result = extracted_text  # Apenas o texto extraído
+            meta = {}
 
-        return jsonify({'result': result}), 200
+        response = {'result': result, **meta}
+        response.update(report)
+        return jsonify(response), 200
 
+    except AgentPoolTimeout as e:
+        return jsonify({'error': str(e)}), 503
+    except AdmissionError:
+        raise
     except Exception as e:
         return jsonify({'error': f'Ocorreu um erro ao processar a imagem: {str(e)}'}), 500
 
+def ocr_batch_item(index, file, preprocess=(), mode=None) -> dict:
+    try:
+        data = read_image_upload(file)
+        return {'index': index, 'filename': file.filename, 'text': ocr_image_bytes(data, preprocess, mode=mode)}
+    except UploadError as e:
+        return {'index': index, 'filename': file.filename, 'error': str(e)}
+    except AdmissionError:
+        # Sobrecarga recusa o lote inteiro em vez de chamar o agente com texto parcial
+        raise
+    except Exception as e:
+        return {'index': index, 'filename': file.filename, 'error': f'Erro ao extrair texto: {str(e)}'}
+
+@app.route('/process-images', methods=['POST'])
+def process_images():
+    image_files = request.files.getlist('images') or request.files.getlist('image')
+    if not image_files:
+        return jsonify({'error': 'Nenhum arquivo de imagem fornecido.'}), 400
+
+    user_prompt = request.form.get('prompt', '')  # Prompt opcional, executado uma vez sobre todo o texto
+    try:
+        preprocess = get_preprocess_stages()
+        mode = get_ocr_mode()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    uploads = [(i, f, preprocess, mode) for i, f in enumerate(image_files)]
+
+    try:
+        # OCR em paralelo (cada thread envia o job ao pool de processos); map preserva a ordem.
+        # Cada item leva uma cópia do contexto (prazo da requisição e rótulo das métricas)
+        max_workers = max(1, min(len(uploads), os.cpu_count() or 1))
+        contexts = [contextvars.copy_context() for _ in uploads]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda context, item: context.run(ocr_batch_item, *item), contexts, uploads))
+
+        response = {'results': results}
+
+        combined_text = "\n\n".join(
+            f"--- Imagem {r['index'] + 1} ({r['filename']}) ---\n{r['text']}"
+            for r in results if r.get('text')
+        )
+        if user_prompt.strip() and combined_text:
+            response['result'], meta = run_agent_cached(
+                'process-images', combined_text, user_prompt, is_refresh_request(), get_latency_budget()
+            )
+            response.update(meta)
+
+        return jsonify(response), 200
+
+    except AgentPoolTimeout as e:
+        return jsonify({'error': str(e)}), 503
+    except AdmissionError:
+        raise
+    except Exception as e:
+        return jsonify({'error': f'Ocorreu um erro ao processar as imagens: {str(e)}'}), 500
+
+# Streaming (Server-Sent Events): texto do OCR, passos do agente e resposta final
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def stream_agent_run(
+    prompt: str,
+    cache_key: str | None = None,
+    task: str = '',
+    latency_budget: float | None = None,
+    extracted_text: str = '',
+    user_prompt: str = '',
+):
+    from smolagents.agent_types import handle_agent_output_types
+    from smolagents.memory import ActionStep
+
+    final_answer = None
+    with agent_admission.slot(), get_agent_pool().agent() as agent, routing_context(task, latency_budget) as routing:
+        # O smolagents embrulha os erros do modelo; o prazo esgotado precisa chegar como 504
+        with unwrapped_admission_errors():
+            for step_log in agent.run(prompt, stream=True):
+                if isinstance(step_log, ActionStep):
+                    yield sse_event('step', {
+                        'step_number': step_log.step_number,
+                        # Contagens do próprio passo (gravadas por metrics.record_agent_step)
+                        'input_tokens': getattr(step_log, 'input_token_count', None),
+                        'output_tokens': getattr(step_log, 'output_token_count', None),
+                        'duration': step_log.duration,
+                        'error': str(step_log.error) if step_log.error is not None else None,
+                        'routing': routing[-1] if routing else None,
+                    })
+                final_answer = getattr(step_log, 'final_answer', step_log)
+        cacheable = cacheable_answer(extracted_text, agent)
+
+    result = str(handle_agent_output_types(final_answer))
+    if cache_key is not None and cacheable:
+        store_key = agent_cache_key(task, extracted_text, user_prompt, answered_model_id(routing))
+        agent_cache.set(store_key, result)
+        index_analysis(store_key, task, extracted_text, user_prompt, result)
+    yield sse_event('final', {'result': result, 'cached': False, 'routing': routing})
+
+def stream_image_analysis(
+    data: bytes, task: str, user_prompt='', preprocess=(), refresh=False, latency_budget=None, mode=None
+):
+    try:
+        extracted_text = extract_text_from_image(data, preprocess, mode)
+        yield sse_event('ocr', {'text': extracted_text})
+
+        if not extracted_text:
+            yield sse_event('final', {'result': ''})
+            return
+
+        # /process-image sem pergunta: devolve apenas o texto extraído
+        if task == 'process-image' and not user_prompt.strip():
+            yield sse_event('final', {'result': extracted_text})
+            return
+
+        listing = listing_fields(task, extracted_text)
+        if listing is not None:
+            yield sse_event('listing', listing)
+
+        prompt, tokens = build_task_prompt(task, extracted_text, user_prompt, facts=listing_prompt_facts(listing))
+        yield sse_event('prompt', {'tokens': tokens})
+
+        cache_key = agent_cache_key(task, extracted_text, user_prompt, planned_model_id(task, tokens['prompt']))
+        cached = None if refresh else agent_cache.get(cache_key)
+        if cached is not None:
+            yield sse_event('final', {'result': cached, 'cached': True})
+            return
+
+        yield from stream_agent_run(prompt, cache_key, task, latency_budget, extracted_text, user_prompt)
+    except AdmissionError as e:
+        yield sse_event('error', {'error': str(e), 'status': e.status_code, 'retry_after': e.retry_after})
+    except Exception as e:
+        yield sse_event('error', {'error': f'Ocorreu um erro ao processar a imagem: {str(e)}'})
+
+def sse_response(generator):
+    return Response(
+        stream_with_context(generator),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/analyze-image/stream', methods=['POST'])
+def analyze_image_stream():
+    image_file = request.files.get('image')
+    if image_file is None or image_file.filename == '':
+        return jsonify({'error': 'Nenhum arquivo de imagem fornecido.'}), 400
+
+    try:
+        preprocess = get_preprocess_stages()
+        mode = get_ocr_mode()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Recusa com 429 antes de abrir o stream se as filas já estiverem cheias
+    ocr_admission.check()
+    agent_admission.check()
+    return sse_response(stream_image_analysis(
+        read_image_upload(image_file), 'analyze-image', preprocess=preprocess,
+        refresh=is_refresh_request(), latency_budget=get_latency_budget(), mode=mode,
+    ))
+
+@app.route('/process-image/stream', methods=['POST'])
+def process_image_stream():
+    image_file = request.files.get('image')
+    if image_file is None or image_file.filename == '':
+        return jsonify({'error': 'Nenhum arquivo de imagem fornecido.'}), 400
+
+    user_prompt = request.form.get('prompt', '')
+    try:
+        preprocess = get_preprocess_stages()
+        mode = get_ocr_mode()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    ocr_admission.check()
+    if user_prompt.strip():
+        agent_admission.check()
+    return sse_response(stream_image_analysis(
+        read_image_upload(image_file), 'process-image', user_prompt, preprocess=preprocess,
+        refresh=is_refresh_request(), latency_budget=get_latency_budget(), mode=mode,
+    ))
+
+# PDFs/TIFFs multipágina podem ser maiores que uma imagem isolada
+DOCUMENT_MAX_BYTES = int(os.getenv("DOCUMENT_MAX_BYTES", str(50 * 1024 * 1024)))
+
+@app.route('/process-document', methods=['POST'])
+def process_document():
+    """OCR de PDFs e TIFFs multipágina, com as páginas enviadas (SSE) conforme ficam prontas."""
+    document = request.files.get('document') or request.files.get('image')
+    if document is None or document.filename == '':
+        return jsonify({'error': 'Nenhum documento fornecido.'}), 400
+
+    try:
+        pages = parse_page_range(request.form.get('pages'))
+        dpi = parse_dpi(request.form.get('dpi'), int(os.getenv("DOCUMENT_DPI", "300")))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    data = read_upload(document, DOCUMENT_MAX_BYTES)
+    ocr_admission.check()
+    workers = get_engine().workers or 1
+
+    def generate():
+        count = 0
+        try:
+            for result in ocr_document(data, ocr_image_bytes, pages=pages, workers=workers, dpi=dpi):
+                count += 1
+                yield sse_event('page', result)
+            yield sse_event('done', {'pages': count})
+        except Exception as e:
+            yield sse_event('error', {'error': f'Ocorreu um erro ao processar o documento: {str(e)}'})
+
+    return sse_response(generate())
+
+@app.route('/ocr-cache/stats')
+def ocr_cache_stats():
+    return jsonify(ocr_cache.stats()), 200
+
+@app.route('/agent-cache/stats')
+def agent_cache_stats():
+    return jsonify(agent_cache.stats()), 200
+
+@app.route('/agent-pool/stats')
+def agent_pool_stats():
+    return jsonify(get_agent_pool().stats()), 200
+
+@app.route('/admission/stats')
+def admission_stats():
+    return jsonify({c.name: c.stats() for c in (ocr_admission, agent_admission, email_admission)}), 200
+
+@app.route('/model-router/stats')
+def model_router_stats():
+    if not get_router.is_loaded():
+        return jsonify({'status': 'not loaded'}), 200
+    return jsonify(get_router().stats()), 200
+
+@app.route('/search-cache/stats')
+def search_cache_stats_route():
+    from tools.web_search import search_cache_stats
+    return jsonify(search_cache_stats()), 200
+
+@app.route('/search')
+def search():
+    """Busca textual nos textos extraídos e nas análises anteriores, com paginação."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Parâmetro q é obrigatório.'}), 400
+
+    try:
+        page = max(1, int(request.args.get('page', '1')))
+        per_page = min(100, max(1, int(request.args.get('per_page', '10'))))
+    except ValueError:
+        return jsonify({'error': 'page e per_page devem ser números inteiros.'}), 400
+
+    found = get_search_index().search(
+        query,
+        limit=per_page,
+        offset=(page - 1) * per_page,
+        kind=request.args.get('kind') or None,
+        any_term=request.args.get('match') == 'any',
+    )
+    return jsonify({'query': query, 'page': page, 'per_page': per_page, **found}), 200
+
+@app.route('/search/stats')
+def search_index_stats():
+    return jsonify(get_search_index().stats()), 200
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/warmup', methods=['GET', 'POST'])
+def warmup():
+    """Inicializa modelos, agente e pool de OCR antes do primeiro pedido real."""
+    try:
+        get_engine().warmup()
+        timings = warm_up()
+        return jsonify({'status': 'ready', 'startup_seconds': STARTUP_SECONDS, 'init_timings': timings}), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+            'startup_seconds': STARTUP_SECONDS,
+            'init_timings': dict(init_timings),
+        }), 500
+
 @app.route('/test-smtp-connection')
 def test_smtp_connection():
     try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=10) as server:
-            server.ehlo()
-            server.starttls()
-            server.login(EMAIL_USER, EMAIL_PASSWORD)
+        with smtp_pool.session():
             return jsonify({
                 "status": "success",
                 "message": "Conexão SMTP bem-sucedida!",
                 "server": SMTP_SERVER,
-                "port": SMTP_PORT
+                "port": SMTP_PORT,
+                "pool": smtp_pool.stats()
             }), 200
     except Exception as e:
         return jsonify({
@@ -212,22 +848,39 @@ def send_email_route():
     if 'email' not in request.form:
         return jsonify({'error': 'Nenhum e-mail fornecido.'}), 400
     
-    email = request.form['email']
+    # Vários destinatários: campos 'email' repetidos ou separados por vírgula
+    recipients = [
+        address.strip()
+        for value in request.form.getlist('email')
+        for address in value.split(',')
+        if address.strip()
+    ]
+    if not recipients:
+        return jsonify({'error': 'Nenhum e-mail fornecido.'}), 400
+
+    email = recipients[0]
     text = request.form.get('text', '')
     image = request.files.get('image')
+    # Anexo lido uma única vez; o mesmo buffer serve a todos os destinatários
+    attachment = read_attachment_bytes(image) if image else None
 
-    if not text and not image:
+    if not text and not attachment:
         return jsonify({'error': 'Nenhum conteúdo para enviar.'}), 400
 
     try:
         subject = "Resultado da extração de texto da imagem"
         body = f"Segue o resultado da extração de texto:\n\n{text}\n\nAtenciosamente,\nSuzukAI"
 
+        if len(recipients) > 1:
+            result = send_bulk_email(recipients, subject, body, attachment=attachment)
+            status = 200 if not result['failed'] else 207
+            return jsonify(result), status
+
         success = send_email(
             to_email=email,
             subject=subject,
             body=body,
-            attachment=image
+            attachment=attachment
         )
 
         if success:
@@ -235,8 +888,14 @@ def send_email_route():
         else:
             return jsonify({'error': 'Falha ao enviar e-mail.'}), 500
 
+    except AdmissionError:
+        raise
     except Exception as e:
         return jsonify({'error': f'Ocorreu um erro ao enviar o e-mail: {str(e)}'}), 500
 
+# Tempo de inicialização do módulo (cold start sem modelos)
+STARTUP_SECONDS = round(time.perf_counter() - _import_started, 4)
+print(f"api.py carregado em {STARTUP_SECONDS}s")
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -1,15 +1,15 @@
-from smolagents import CodeAgent,DuckDuckGoSearchTool,load_tool,tool,LiteLLMModel, HfApiModel
+import time
+_import_started = time.perf_counter()
+
+from smolagents import tool
 import datetime
-import requests
 import pytz
-import yaml
 from tools.final_answer import FinalAnswerTool
-import ollama
 import os
 from dotenv import load_dotenv
-from PIL import Image
-import pytesseract
 from flask import Flask, jsonify, request
+from ocr_engine import get_engine
+from factories import get_agent, init_timings
 
 from Gradio_UI import GradioUI
 HG_TOKEN = os.getenv("HG_TOKEN")
@@ -49,54 +49,32 @@ def extract_text_from_image(image_path: str) -> str:
         image_path: Path to the image file.
     """
     try:
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image)
-        return f"Extracted text: {text.strip()}"
+        with open(image_path, "rb") as f:
+            text = get_engine().image_to_string(f.read())
+        return f"Extracted text: {text}"
     except Exception as e:
         return f"Error extracting text: {str(e)}"
 
 final_answer = FinalAnswerTool()
 
-# If the agent does not answer, the model is overloaded, please use another model or the following Hugging Face Endpoint that also contains qwen2.5 coder:
-# model_id='https://pflgm2locj2t89co.us-east-1.aws.endpoints.huggingface.cloud' 
-
-model = HfApiModel(
-    max_tokens=2096,
-    temperature=0.5,
-    model_id='Qwen/Qwen2.5-Coder-32B-Instruct',# it is possible that this model may be overloaded
-    custom_role_conversions=None,
-    token=HG_TOKEN
-)
-
-# ollama_model = ollama.chat(model="deepseek-r1:7b")
+# Modelos, ferramenta de geração de imagem, templates e agente são criados sob demanda
+# (ver factories.py). Para outro endpoint do Hugging Face com qwen2.5 coder, defina MODEL_ID, ex.:
+# MODEL_ID='https://pflgm2locj2t89co.us-east-1.aws.endpoints.huggingface.cloud'
 
-lite_model = LiteLLMModel(
-    model_id="ollama/deepseek-r1:7b",
-    temperature=0.6, 
-    max_tokens=200
-)
+# Tempo de inicialização do módulo (cold start sem modelos)
+STARTUP_SECONDS = round(time.perf_counter() - _import_started, 4)
 
-# Import tool from Hub
-image_generation_tool = load_tool("agents-course/text-to-image", trust_remote_code=True)
+def main():
+    print(f"app.py carregado em {STARTUP_SECONDS}s")
+    agent = get_agent()
+    print(f"Inicialização sob demanda: {init_timings}")
 
-with open("prompts.yaml", 'r') as stream:
-    prompt_templates = yaml.safe_load(stream)
-    
-agent = CodeAgent(
-    model=model,
-    tools=[DuckDuckGoSearchTool(), image_generation_tool], ## add your tools here (don't remove final answer)
-    max_steps=6,
-    verbosity_level=1,
-    grammar=None,
-    planning_interval=None,
-    name=None,
-    description=None,
-    prompt_templates=prompt_templates
-)
+    # Launches the GUI interface, just remove the comment from the line above
+    # GradioUI(agent).launch()
+    image_text = extract_text_from_image("./img/teste.png")
+    # user_input = input("Digite sua pergunta: ")
+    response = agent.run(f"this text got extracted from an image: {image_text}. What does that means? Answer in brazilian portuguese")
+    print(response)
 
-# Launches the GUI interface, just remove the comment from the line above
-# GradioUI(agent).launch()
-image_text = extract_text_from_image("./img/teste.png")
-# user_input = input("Digite sua pergunta: ")
-response = agent.run(f"this text got extracted from an image: {image_text}. What does that means? Answer in brazilian portuguese")
-print(response)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""Servidor ASGI (FastAPI + uvicorn) com os mesmos contratos de /analyze-image, /process-image e /send-email.
+
+Os handlers são assíncronos: o OCR (CPU) roda no pool de processos de ocr_engine.py,
+e as chamadas bloqueantes (agente/LLM e SMTP) rodam em um pool de threads próprio,
+de modo que o event loop continua aceitando requisições enquanto elas aguardam.
+
+Uso:
+    python asgi.py                                # lê ASGI_HOST, ASGI_PORT, ASGI_WORKERS...
+    uvicorn asgi:app --workers 4 --port 8000
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from starlette.datastructures import UploadFile
+from starlette.routing import Match
+
+import api
+import metrics
+from admission import AdmissionError, reset_deadline, set_deadline, without_deadline
+from agent_pool import AgentPoolTimeout
+from jobs import JobQueueFull
+from ocr_engine import get_engine
+from preprocessing import parse_stages
+from regions import parse_mode
+from uploads import UploadError, UploadTooLarge, read_image_upload, read_upload
+
+# Tamanho máximo do corpo da requisição, o mesmo do servidor Flask
+REQUEST_MAX_BYTES = int(os.getenv("REQUEST_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Threads que aguardam o pool de processos do OCR (uma por job em execução ou na fila)
+ocr_executor = ThreadPoolExecutor(
+    max_workers=(get_engine().workers or 1) + int(os.getenv("OCR_QUEUE_SIZE", "32")),
+    thread_name_prefix="asgi-ocr",
+)
+# Threads para chamadas bloqueantes de rede: agente/LLM e SMTP
+blocking_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ASGI_THREADS", "64")),
+    thread_name_prefix="asgi-io",
+)
+
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    ocr_executor.shutdown(wait=False, cancel_futures=True)
+    blocking_executor.shutdown(wait=False, cancel_futures=True)
+    get_engine().shutdown()
+
+
+app = FastAPI(title="SuzukAI", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+def too_large_message(max_bytes: int) -> str:
+    return f'Requisição maior que o limite de {max_bytes // (1024 * 1024)} MB.'
+
+
+class BodySizeLimit:
+    """Middleware ASGI que recusa com 413 corpos acima de `max_bytes` antes de o formulário ser lido.
+
+    Pelo Content-Length a recusa é imediata; sem ele (chunked), os bytes são contados
+    conforme chegam e a leitura é interrompida ao passar do limite.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse({'error': too_large_message(self.max_bytes)}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise UploadTooLarge(too_large_message(self.max_bytes))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(BodySizeLimit, max_bytes=REQUEST_MAX_BYTES)
+
+
+async def run_in(executor, fn, *args):
+    """Executa `fn` no executor sem bloquear o event loop, preservando o contexto (ex.: rótulo de métricas)."""
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, context.run, functools.partial(fn, *args))
+
+
+def error(message, status_code):
+    return JSONResponse({'error': message}, status_code=status_code)
+
+
+def route_path(request: Request) -> str:
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return 'unknown'
+
+
+@app.middleware('http')
+async def request_metrics(request: Request, call_next):
+    endpoint = route_path(request)
+    token = metrics.set_endpoint(endpoint)
+    # Prazo da requisição; copiado junto com o contexto para as threads de OCR, agente e SMTP
+    deadline_token = set_deadline(api.get_request_timeout(
+        request.headers.get('X-Request-Timeout') or request.query_params.get('timeout'), endpoint
+    ))
+    start = asyncio.get_running_loop().time()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.observe(
+            'request_duration_seconds',
+            asyncio.get_running_loop().time() - start,
+            endpoint=endpoint,
+            method=request.method,
+        )
+        metrics.inc('requests_total', endpoint=endpoint, status=str(status))
+        reset_deadline(deadline_token)
+        metrics.reset_endpoint(token)
+
+
+def request_flag(request: Request, form, name: str) -> bool:
+    value = request.query_params.get(name) or form.get(name) or ''
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def get_latency_budget(request: Request, form) -> float | None:
+    value = request.query_params.get('latency_budget') or form.get('latency_budget')
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+@app.exception_handler(UploadError)
+async def upload_error(request: Request, e: UploadError):
+    return error(str(e), e.status_code)
+
+
+@app.exception_handler(AdmissionError)
+async def admission_error(request: Request, e: AdmissionError):
+    response = JSONResponse({'error': str(e), 'retry_after': e.retry_after}, status_code=e.status_code)
+    if e.retry_after is not None:
+        response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+
+def get_upload(form, name: str):
+    upload = form.get(name)
+    return upload if isinstance(upload, UploadFile) else None
+
+
+@app.post('/analyze-image')
+async def analyze_image(request: Request):
+    form = await request.form()
+    image_file = get_upload(form, 'image')
+    if image_file is None:
+        return error('Nenhum arquivo de imagem fornecido.', 400)
+    if image_file.filename == '':
+        return error('Nome de arquivo inválido.', 400)
+
+    try:
+        preprocess = parse_stages(form.get('preprocess', api.OCR_PREPROCESS))
+        mode = parse_mode(form.get('ocr_mode') or api.OCR_MODE)
+    except ValueError as e:
+        return error(str(e), 400)
+
+    # Um único buffer por upload, validado pelo cabeçalho antes de decodificar (fora do event loop)
+    data = await run_in(blocking_executor, read_image_upload, image_file.file)
+    refresh = request_flag(request, form, 'refresh')
+    latency_budget = get_latency_budget(request, form)
+
+    if request_flag(request, form, 'async'):
+        try:
+            job_id = api.job_manager.submit(
+                without_deadline, api.analyze_image_job, data, preprocess, refresh, latency_budget, mode
+            )
+        except JobQueueFull as e:
+            response = error(str(e), 503)
+            response.headers['Retry-After'] = str(api.agent_admission.retry_after())
+            return response
+        return JSONResponse({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'}, status_code=202)
+
+    try:
+        extracted_text = await run_in(ocr_executor, api.extract_text_from_image, data, preprocess, mode)
+        if not extracted_text:
+            return error('Nenhum texto foi extraído da imagem.', 400)
+
+        response, meta = await run_in(
+            blocking_executor, api.run_agent_cached, 'analyze-image', extracted_text, '', refresh, latency_budget
+        )
+        return JSONResponse({'explanation': response, **meta})
+
+    except AgentPoolTimeout as e:
+        return error(str(e), 503)
+    except AdmissionError:
+        raise
+    except Exception as e:
+        return error(f'Ocorreu um erro ao processar a imagem: {str(e)}', 500)
+
+
+@app.get('/jobs/{job_id}')
+async def get_job(job_id: str):
+    job = api.job_manager.get(job_id)
+    if job is None:
+        return error('Job não encontrado ou expirado.', 404)
+    return JSONResponse(job)
+
+
+@app.post('/process-image')
+async def process_image(request: Request):
+    form = await request.form()
+    image_file = get_upload(form, 'image')
+    if image_file is None:
+        return error('Nenhum arquivo de imagem fornecido.', 400)
+    if image_file.filename == '':
+        return error('Nome de arquivo inválido.', 400)
+    user_prompt = form.get('prompt', '')  # Prompt opcional do usuário
+
+    try:
+        preprocess = parse_stages(form.get('preprocess', api.OCR_PREPROCESS))
+        mode = parse_mode(form.get('ocr_mode') or api.OCR_MODE)
+    except ValueError as e:
+        return error(str(e), 400)
+
+    data = await run_in(blocking_executor, read_image_upload, image_file.file)
+    try:
+        # Extrair texto da imagem (com tempos do pré-processamento e memória usada no OCR)
+        report = {}
+        try:
+            extracted_text = await run_in(ocr_executor, api.ocr_image_bytes, data, preprocess, report, mode)
+        except AdmissionError:
+            raise
+        except Exception as e:
+            extracted_text = f"{api.OCR_ERROR_PREFIX}{str(e)}"
+
+        if not extracted_text:
+            return JSONResponse({'result': ''})  # Sem texto extraído
+
+        # Analisar com o agente apenas se houver prompt
+        if user_prompt.strip():
+            result, meta = await run_in(
+                blocking_executor, api.run_agent_cached, 'process-image', extracted_text, user_prompt,
+                request_flag(request, form, 'refresh'), get_latency_budget(request, form),
+            )
+        else:
+            result, meta = extracted_text, {}  # Apenas o texto extraído
+
+        response = {'result': result, **meta}
+        response.update(report)
+        return JSONResponse(response)
+
+    except AgentPoolTimeout as e:
+        return error(str(e), 503)
+    except AdmissionError:
+        raise
+    except Exception as e:
+        return error(f'Ocorreu um erro ao processar a imagem: {str(e)}', 500)
+
+
+@app.post('/send-email')
+async def send_email_route(request: Request):
+    form = await request.form()
+
+    # Vários destinatários: campos 'email' repetidos ou separados por vírgula
+    recipients = [
+        address.strip()
+        for value in form.getlist('email')
+        for address in value.split(',')
+        if address.strip()
+    ]
+    if not recipients:
+        return error('Nenhum e-mail fornecido.', 400)
+
+    text = form.get('text', '')
+    upload = get_upload(form, 'image')
+    # Anexo lido uma única vez; o mesmo buffer serve a todos os destinatários
+    attachment = None
+    if upload is not None and upload.filename:
+        attachment = await run_in(blocking_executor, read_upload, upload.file), upload.filename
+
+    if not text and not attachment:
+        return error('Nenhum conteúdo para enviar.', 400)
+
+    try:
+        subject = "Resultado da extração de texto da imagem"
+        body = f"Segue o resultado da extração de texto:\n\n{text}\n\nAtenciosamente,\nSuzukAI"
+
+        if len(recipients) > 1:
+            result = await run_in(blocking_executor, api.send_bulk_email, recipients, subject, body, attachment)
+            return JSONResponse(result, status_code=200 if not result['failed'] else 207)
+
+        success = await run_in(blocking_executor, api.send_email, recipients[0], subject, body, attachment)
+        if success:
+            return JSONResponse({'message': 'E-mail enviado com sucesso!'})
+        return error('Falha ao enviar e-mail.', 500)
+
+    except AdmissionError:
+        raise
+    except Exception as e:
+        return error(f'Ocorreu um erro ao enviar o e-mail: {str(e)}', 500)
+
+
+@app.get('/admission/stats')
+async def admission_stats():
+    return JSONResponse({c.name: c.stats() for c in (api.ocr_admission, api.agent_admission, api.email_admission)})
+
+
+@app.get('/metrics')
+async def metrics_endpoint():
+    return Response(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+@app.api_route('/warmup', methods=['GET', 'POST'])
+async def warmup():
+    try:
+        # Sobe os workers de OCR fora do event loop
+        await run_in(blocking_executor, get_engine().warmup)
+        timings = await run_in(blocking_executor, api.warm_up)
+        return JSONResponse({'status': 'ready', 'startup_seconds': api.STARTUP_SECONDS, 'init_timings': timings})
+    except Exception as e:
+        return JSONResponse({'status': 'error', 'error': str(e)}, status_code=500)
+
+
+def main():
+    import uvicorn
+
+    limit = os.getenv("ASGI_LIMIT_CONCURRENCY")
+    uvicorn.run(
+        "asgi:app",
+        host=os.getenv("ASGI_HOST", "0.0.0.0"),
+        port=int(os.getenv("ASGI_PORT", "8000")),
+        # Cada worker é um processo com seu próprio event loop, pools e agentes
+        workers=int(os.getenv("ASGI_WORKERS", "1")),
+        limit_concurrency=int(limit) if limit else None,
+        backlog=int(os.getenv("ASGI_BACKLOG", "2048")),
+        timeout_keep_alive=int(os.getenv("ASGI_KEEP_ALIVE", "5")),
+    )
+
+
+if __name__ == '__main__':
+    main()
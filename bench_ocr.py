@@ -0,0 +1,256 @@
+"""Benchmark de throughput do OCR, totalmente offline.
+
+Executa `extract_text_from_image` (api.py) sobre as imagens de img/ e sobre
+documentos sintéticos gerados em várias resoluções, e reporta percentis de
+latência, páginas/s por núcleo e pico de RSS. Pode salvar um baseline em JSON
+e comparar execuções futuras com ele, falhando (código de saída 1) em regressões.
+
+Uso:
+    python bench_ocr.py                                  # roda e imprime o relatório
+    python bench_ocr.py --save-baseline bench_baseline.json
+    python bench_ocr.py --baseline bench_baseline.json --tolerance 0.15
+    python bench_ocr.py --preprocess full --repeat 5 --dpi 150,300
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+IMG_DIR = Path(__file__).parent / "img"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp"}
+ERROR_PREFIX = "Erro ao extrair texto"
+
+# Página A4 em polegadas; a resolução define o tamanho em pixels do documento sintético
+PAGE_INCHES = (8.27, 11.69)
+WORDS = (
+    "apartamento casa venda aluguel quartos banheiros vaga garagem area total metros "
+    "quadrados valor condominio iptu endereco rua avenida bairro cidade estado "
+    "documento contrato pagamento parcela data assinatura cliente imovel"
+).split()
+
+
+class NoCache:
+    """Substitui o cache de OCR para que cada iteração execute o OCR de verdade."""
+
+    def get_or_compute(self, data, settings, compute):
+        return compute()
+
+
+def load_fixtures() -> list[tuple[str, bytes]]:
+    return [
+        (f"img/{path.name}", path.read_bytes())
+        for path in sorted(IMG_DIR.iterdir())
+        if path.suffix.lower() in IMAGE_SUFFIXES
+    ]
+
+
+def synthetic_document(dpi: int, seed: int = 0) -> bytes:
+    """Página de texto corrido renderizada em PNG, reprodutível pelo `seed`."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = int(PAGE_INCHES[0] * dpi), int(PAGE_INCHES[1] * dpi)
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    size = max(8, dpi // 8)
+    try:
+        font = ImageFont.load_default(size=size)
+    except TypeError:
+        font = ImageFont.load_default()
+
+    rng = random.Random(seed)
+    margin, line_height = dpi // 2, int(size * 1.6)
+    y = margin
+    while y + line_height < height - margin:
+        line = " ".join(rng.choice(WORDS) for _ in range(10))
+        draw.text((margin, y), line, fill=0, font=font)
+        y += line_height
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def build_cases(dpis, include_fixtures=True, include_synthetic=True) -> list[tuple[str, bytes]]:
+    cases = load_fixtures() if include_fixtures else []
+    if include_synthetic:
+        cases += [(f"synthetic@{dpi}dpi", synthetic_document(dpi, seed=dpi)) for dpi in dpis]
+    return cases
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = (len(ordered) - 1) * q
+    low, high = int(index), min(int(index) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (index - low)
+
+
+def summarize(latencies, errors, wall, cores) -> dict:
+    pages = len(latencies)
+    return {
+        "pages": pages,
+        "errors": errors,
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p90": percentile(latencies, 0.90),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies, default=0.0),
+        "pages_per_sec_per_core": pages / wall / cores if wall > 0 else 0.0,
+    }
+
+
+def peak_rss_mb(worker_peaks) -> dict:
+    # ru_maxrss está em KB no Linux e em bytes no macOS. Os workers são filhos do forkserver,
+    # fora do alcance de RUSAGE_CHILDREN: o pico deles vem da medição feita em cada job
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "main": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "workers": max(worker_peaks, default=None),
+    }
+
+
+def job_peak_mb(memory: dict) -> float | None:
+    # Pico do job no Linux; sem como zerar o pico do processo, o RSS ao fim do job
+    return memory.get("job_peak_rss_mb", memory.get("rss_after_mb"))
+
+
+def run_benchmark(cases, repeat: int, concurrency: int, preprocess=(), warmup: bool = True) -> dict:
+    # Os textos do benchmark vão para um índice de busca descartável, não para o índice real
+    os.environ["SEARCH_INDEX_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_ocr_"), "search_index.sqlite3")
+    import api
+
+    api.ocr_cache = NoCache()
+    engine = api.get_engine()
+    if warmup:
+        engine.warmup()
+        # Uma passada fora da medição para carregar modelos de idioma e código do PIL
+        api.extract_text_from_image(io.BytesIO(cases[0][1]), preprocess)
+
+    def measure(data):
+        ocr_report = {}
+        start = time.perf_counter()
+        text = api.extract_text_from_image(io.BytesIO(data), preprocess, report=ocr_report)
+        return time.perf_counter() - start, text.startswith(ERROR_PREFIX), job_peak_mb(ocr_report.get("memory", {}))
+
+    # Núcleos efetivamente usados: workers do pool, ou threads quando o OCR roda em processo
+    cores = max(1, min(concurrency, engine.workers or concurrency))
+    report = {"cases": {}}
+    all_latencies, all_errors, total_wall, worker_peaks = [], 0, 0.0, []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for name, data in cases:
+            start = time.perf_counter()
+            results = list(executor.map(measure, [data] * repeat))
+            wall = time.perf_counter() - start
+
+            latencies = [seconds for seconds, _, _ in results]
+            errors = sum(1 for _, failed, _ in results if failed)
+            worker_peaks += [peak for _, _, peak in results if peak is not None]
+            report["cases"][name] = dict(summarize(latencies, errors, wall, cores), bytes=len(data))
+            all_latencies += latencies
+            all_errors += errors
+            total_wall += wall
+
+    engine.shutdown()
+    report["total"] = summarize(all_latencies, all_errors, total_wall, cores)
+    report["peak_rss_mb"] = peak_rss_mb(worker_peaks)
+    report["settings"] = {
+        "repeat": repeat,
+        "concurrency": concurrency,
+        "ocr_workers": engine.workers,
+        "preprocess": list(preprocess),
+        "ocr": api.OCR_SETTINGS,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Lista as regressões: latência (p50/p90) acima ou throughput abaixo do baseline além da tolerância."""
+    regressions = []
+    for name, current in list(report["cases"].items()) + [("total", report["total"])]:
+        previous = baseline["total"] if name == "total" else baseline.get("cases", {}).get(name)
+        if previous is None:
+            continue
+        for metric in ("p50", "p90"):
+            if previous[metric] > 0 and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {metric} {current[metric] * 1000:.1f} ms > baseline {previous[metric] * 1000:.1f} ms"
+                )
+        metric = "pages_per_sec_per_core"
+        if previous[metric] > 0 and current[metric] < previous[metric] * (1 - tolerance):
+            regressions.append(f"{name}: {metric} {current[metric]:.2f} < baseline {previous[metric]:.2f}")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: {current['errors']} erros (baseline {previous['errors']})")
+    return regressions
+
+
+def print_report(report: dict):
+    header = f"{'caso':<28}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'pág/s/núcleo':>15}{'erros':>8}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["cases"].items()) + [("total", report["total"])]
+    for name, row in rows:
+        print(
+            f"{name:<28}{row['p50'] * 1000:>10.1f}{row['p90'] * 1000:>10.1f}{row['p99'] * 1000:>10.1f}"
+            f"{row['pages_per_sec_per_core']:>15.2f}{row['errors']:>8}"
+        )
+    rss = report["peak_rss_mb"]
+    workers = "n/d" if rss["workers"] is None else f"{rss['workers']:.1f} MB"
+    print(f"\nPico de RSS: processo principal {rss['main']:.1f} MB, workers {workers}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark offline do OCR (extract_text_from_image).")
+    parser.add_argument("--repeat", type=int, default=3, help="execuções por imagem")
+    parser.add_argument("--concurrency", type=int, default=None, help="requisições simultâneas (padrão: OCR_WORKERS)")
+    parser.add_argument("--dpi", default="100,200,300", help="resoluções dos documentos sintéticos")
+    parser.add_argument("--preprocess", default="none", help="preset ou estágios de pré-processamento")
+    parser.add_argument("--no-fixtures", action="store_true", help="ignora as imagens de img/")
+    parser.add_argument("--no-synthetic", action="store_true", help="ignora os documentos sintéticos")
+    parser.add_argument("--json", dest="json_path", help="grava o relatório completo em JSON")
+    parser.add_argument("--save-baseline", help="grava o relatório como baseline")
+    parser.add_argument("--baseline", help="compara com um baseline salvo e falha em regressões")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="piora relativa tolerada (0.15 = 15%%)")
+    args = parser.parse_args(argv)
+
+    from preprocessing import parse_stages
+
+    dpis = [int(value) for value in args.dpi.split(",") if value.strip()]
+    cases = build_cases(dpis, not args.no_fixtures, not args.no_synthetic)
+    if not cases:
+        parser.error("nenhuma imagem para medir")
+
+    concurrency = args.concurrency or int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+    report = run_benchmark(cases, args.repeat, concurrency, parse_stages(args.preprocess))
+    print_report(report)
+
+    for path in (args.json_path, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressões em relação a {args.baseline} (tolerância {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nSem regressões em relação a {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import contextvars
+import io
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from PIL import Image
+
+from uploads import MAX_IMAGE_PIXELS, check_image_size
+
+# Resolução aceita para renderizar PDFs; valores fora do intervalo são ajustados
+MIN_DPI = 72
+MAX_DPI = 600
+
+
+def parse_page_range(value: str | None) -> list | None:
+    """Converte '1-3,7' em [(1, 3), (7, 7)]. Vazio significa todas as páginas.
+
+    Os intervalos só são expandidos em `expand_pages`, limitados ao total de
+    páginas do documento, para que '1-5000000' não aloque milhões de números.
+    """
+    if not value or not value.strip():
+        return None
+    ranges = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            start, end = int(start), int(end)
+            if start < 1 or end < start:
+                raise ValueError(f"Intervalo de páginas inválido: '{part}'")
+            ranges.append((start, end))
+        else:
+            page = int(part)
+            if page < 1:
+                raise ValueError(f"Página inválida: '{part}'")
+            ranges.append((page, page))
+    return ranges
+
+
+def expand_pages(ranges: list | None, count: int) -> set | None:
+    """Números das páginas pedidas que existem em um documento de `count` páginas."""
+    if ranges is None:
+        return None
+    pages = set()
+    for start, end in ranges:
+        pages.update(range(start, min(end, count) + 1))
+    return pages
+
+
+def parse_dpi(value: str | None, default: int = 300) -> int:
+    """Resolução pedida, ajustada para o intervalo [MIN_DPI, MAX_DPI]; lança ValueError se inválida."""
+    try:
+        dpi = int(value) if value else default
+    except ValueError:
+        raise ValueError(f"dpi inválido: '{value}'")
+    return max(MIN_DPI, min(MAX_DPI, dpi))
+
+
+def is_pdf(data: bytes) -> bool:
+    return data[:5] == b"%PDF-"
+
+
+def _encode_page(image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _iter_pdf_pages(data: bytes, pages: list | None, dpi: int):
+    try:
+        import pypdfium2 as pdfium
+    except ImportError as e:
+        raise ImportError(
+            "You must install package `pypdfium2` to extract text from PDFs: for instance run `pip install pypdfium2`."
+        ) from e
+
+    pdf = pdfium.PdfDocument(data)
+    try:
+        wanted = expand_pages(pages, len(pdf))
+        for index in range(len(pdf)):
+            page_number = index + 1
+            if wanted is not None and page_number not in wanted:
+                continue
+            page = pdf[index]
+            try:
+                # Verifica o tamanho antes de renderizar: páginas enormes usam uma escala menor
+                width, height = page.get_size()
+                scale = min(dpi / 72, (MAX_IMAGE_PIXELS / max(1.0, width * height)) ** 0.5)
+                image = page.render(scale=scale).to_pil()
+            finally:
+                page.close()
+            yield page_number, _encode_page(image)
+    finally:
+        pdf.close()
+
+
+def _iter_image_frames(data: bytes, pages: list | None):
+    with Image.open(io.BytesIO(data)) as image:
+        frames = getattr(image, "n_frames", 1)
+        wanted = expand_pages(pages, frames)
+        for index in range(frames):
+            page_number = index + 1
+            if wanted is not None and page_number not in wanted:
+                continue
+            image.seek(index)
+            check_image_size(*image.size)
+            yield page_number, _encode_page(image)
+
+
+def iter_pages(data: bytes, pages: list | None = None, dpi: int = 300):
+    """Gera (número da página, PNG em bytes) sob demanda, uma página decodificada por vez.
+
+    Suporta PDFs (via pypdfium2) e imagens com vários quadros, como TIFFs multipágina.
+    """
+    if is_pdf(data):
+        yield from _iter_pdf_pages(data, pages, dpi)
+    else:
+        yield from _iter_image_frames(data, pages)
+
+
+def ocr_document(data: bytes, ocr_fn, pages: list | None = None, workers: int = 4, dpi: int = 300):
+    """Faz o OCR das páginas em paralelo e gera os resultados conforme ficam prontos.
+
+    No máximo `workers * 2` páginas ficam renderizadas em memória ao mesmo tempo.
+    Cada resultado é um dict com 'page' e 'text' ou 'error'.
+    """
+    def run(page_number, page_data):
+        try:
+            return {"page": page_number, "text": ocr_fn(page_data)}
+        except Exception as e:
+            return {"page": page_number, "error": f"Erro ao extrair texto: {str(e)}"}
+
+    window = max(1, workers * 2)
+    page_iter = iter_pages(data, pages, dpi)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for page_number, page_data in page_iter:
+            # Cada página leva uma cópia do contexto (prazo da requisição e rótulo das métricas)
+            pending.add(executor.submit(contextvars.copy_context().run, run, page_number, page_data))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
@@ -0,0 +1,173 @@
+"""Construção preguiçosa (lazy) e compartilhada de modelos, ferramentas, templates e agente.
+
+Nada aqui é criado na importação: cada fábrica roda uma única vez por processo,
+no primeiro uso (ou no warm-up), e registra quanto tempo levou.
+"""
+import functools
+import os
+import threading
+import time
+
+import yaml
+
+from agent_cache import file_hash
+from prompt_builder import template_path
+
+DEFAULT_MODEL_ID = "Qwen/Qwen2.5-Coder-32B-Instruct"
+DEFAULT_LITE_MODEL_ID = "ollama/deepseek-r1:7b"
+
+# Tempo (em segundos) gasto por cada fábrica na primeira chamada
+init_timings = {}
+
+
+def lazy(factory):
+    """Executa `factory` uma única vez (thread-safe) e reaproveita o resultado."""
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    start = time.perf_counter()
+                    instance.append(factory())
+                    init_timings[factory.__name__] = round(time.perf_counter() - start, 4)
+        return instance[0]
+
+    get.is_loaded = lambda: bool(instance)
+    return get
+
+
+@lazy
+def get_model():
+    from smolagents import HfApiModel
+
+    return HfApiModel(
+        max_tokens=2096,
+        temperature=0.5,
+        model_id=os.getenv("MODEL_ID", DEFAULT_MODEL_ID),
+        custom_role_conversions=None,
+        token=os.getenv("HG_TOKEN"),
+    )
+
+
+@lazy
+def get_lite_model():
+    from smolagents import LiteLLMModel
+
+    return LiteLLMModel(
+        model_id=os.getenv("LITE_MODEL_ID", DEFAULT_LITE_MODEL_ID),
+        temperature=0.6,
+        max_tokens=200,
+    )
+
+
+@lazy
+def get_router():
+    """Roteia cada chamada entre o modelo local e o remoto (ver model_router.py)."""
+    from model_router import ModelRouter
+
+    return ModelRouter(
+        local_model=get_lite_model(),
+        remote_model=get_model(),
+        max_local_tokens=int(os.getenv("ROUTER_MAX_LOCAL_TOKENS", "6000")),
+        timeouts={
+            "local": float(os.getenv("ROUTER_LOCAL_TIMEOUT", "30")),
+            "remote": float(os.getenv("ROUTER_REMOTE_TIMEOUT", "120")),
+        },
+    )
+
+
+def get_agent_model():
+    if os.getenv("MODEL_ROUTING", "true").lower() in ("1", "true", "yes"):
+        return get_router()
+    return get_model()
+
+
+@lazy
+def get_image_generation_tool():
+    """Ferramenta de geração de imagem do Hub; None se não puder ser carregada (ex.: offline)."""
+    from smolagents import load_tool
+
+    try:
+        return load_tool("agents-course/text-to-image", trust_remote_code=True)
+    except Exception as e:
+        print(f"Ferramenta de geração de imagem indisponível: {str(e)}")
+        return None
+
+
+@lazy
+def get_prompt_templates():
+    # Conjunto escolhido por PROMPT_TEMPLATE_SET ('default' = prompts.yaml, 'compact' = prompts_compact.yaml)
+    with open(template_path(), 'r') as stream:
+        return yaml.safe_load(stream)
+
+
+@lazy
+def get_prompts_hash():
+    return file_hash(template_path())
+
+
+@lazy
+def get_tools():
+    """Ferramentas compartilhadas por todos os agentes."""
+    from tools.local_search import LocalSearchTool
+    from tools.multi_search import MultiSearchTool
+    from tools.web_search import DuckDuckGoSearchTool
+
+    # Busca local: resultados já extraídos/analisados evitam buscas na web quando a resposta já está aqui.
+    # A busca múltipla faz várias consultas em paralelo em um único passo do agente.
+    web_search = DuckDuckGoSearchTool()
+    tools = [LocalSearchTool(), web_search, MultiSearchTool(search_tool=web_search)]
+    image_generation_tool = get_image_generation_tool()
+    if image_generation_tool is not None:
+        tools.append(image_generation_tool)
+    return tools
+
+
+def build_agent():
+    """Cria um novo CodeAgent reaproveitando modelo, ferramentas e templates já carregados."""
+    from smolagents import CodeAgent
+    from admission import check_deadline
+    from metrics import record_agent_step
+
+    return CodeAgent(
+        model=get_agent_model(),
+        # check_deadline interrompe a execução entre passos quando o prazo da requisição acaba
+        step_callbacks=[record_agent_step, check_deadline],
+        tools=get_tools(),
+        max_steps=6,
+        verbosity_level=1,
+        grammar=None,
+        planning_interval=None,
+        name=None,
+        description=None,
+        prompt_templates=get_prompt_templates(),
+    )
+
+
+@lazy
+def get_agent():
+    """Agente único do processo (usado por app.py)."""
+    return build_agent()
+
+
+@lazy
+def get_agent_pool():
+    """Pool de agentes para atender requisições simultâneas (ver agent_pool.py)."""
+    from agent_pool import AgentPool
+
+    return AgentPool(
+        build_agent,
+        size=int(os.getenv("AGENT_POOL_SIZE", "4")),
+        timeout=float(os.getenv("AGENT_POOL_TIMEOUT", "30")),
+    )
+
+
+def warm_up() -> dict:
+    """Inicializa tudo antecipadamente e retorna os tempos de cada fábrica."""
+    get_agent_pool().warmup()
+    get_lite_model()
+    get_prompts_hash()
+    return dict(init_timings)
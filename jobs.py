@@ -0,0 +1,84 @@
+import contextvars
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFull(Exception):
+    """Não há espaço na fila de jobs."""
+
+
+class JobManager:
+    """Executa tarefas demoradas em segundo plano e guarda os resultados por um tempo (TTL).
+
+    A fila é limitada: `submit` lança JobQueueFull quando há `workers + queue_size`
+    jobs pendentes ou em execução.
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 16, result_ttl: float = 600):
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs) -> str:
+        self._purge_expired()
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull("Fila de processamento cheia, tente novamente em instantes.")
+
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+
+        try:
+            # Propaga o contexto (ex.: endpoint usado nas métricas) para a thread do job
+            context = contextvars.copy_context()
+            self._executor.submit(context.run, self._run, job_id, fn, args, kwargs)
+        except Exception:
+            self._slots.release()
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            raise
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, status="running", started_at=time.time())
+        try:
+            result = fn(*args, **kwargs)
+            self._update(job_id, status="done", result=result, finished_at=time.time())
+        except Exception as e:
+            self._update(job_id, status="error", error=str(e), finished_at=time.time())
+        finally:
+            self._slots.release()
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def get(self, job_id) -> dict | None:
+        self._purge_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["finished_at"] is not None and now - job["finished_at"] > self.result_ttl
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,144 @@
+"""Extração determinística de campos de anúncios imobiliários brasileiros a partir do texto do OCR.
+
+Regras simples (expressões regulares) para área em m², preço em R$, quartos,
+banheiros, vagas e endereço; o preço por m² é calculado aqui, sem o LLM.
+Campos não encontrados ficam como None.
+"""
+import re
+
+NUMBER_WORDS = {"um": 1, "uma": 1, "dois": 2, "duas": 2, "tres": 3, "três": 3, "quatro": 4, "cinco": 5, "seis": 6}
+_COUNT = r"(?<![\w,.])(\d{1,2}|" + "|".join(NUMBER_WORDS) + r")"
+
+MONEY = re.compile(
+    r"R\$\s*(\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:,\d{1,2})?)(?:\s*(mil|milh[õo]es|milh[ãa]o|mi)\b)?",
+    re.I,
+)
+AREA = re.compile(r"(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d+))?\s*(?:m²|m2|mts²|mts|metros\s+quadrados)(?![a-z])", re.I)
+# Para cada campo: primeiro o formato "rótulo: N" (mais explícito), depois "N rótulo"
+ROOMS = (
+    re.compile(r"(?:quartos?|dormit[óo]rios?)\s*:\s*(\d{1,2})", re.I),
+    re.compile(_COUNT + r"\s*(?:quartos?|dormit[óo]rios?|dorms?\b\.?)", re.I),
+)
+BATHROOMS = (
+    re.compile(r"banheiros?\s*:\s*(\d{1,2})", re.I),
+    re.compile(_COUNT + r"\s*(?:banheiros?|wcs?\b)", re.I),
+)
+PARKING = (
+    re.compile(r"vagas?(?:\s+de\s+garagem)?\s*:\s*(\d{1,2})", re.I),
+    re.compile(_COUNT + r"\s*vagas?\b", re.I),
+)
+ADDRESS = re.compile(
+    r"\b(?:rua|r\.|avenida|av\.|alameda|al\.|travessa|tv\.|estrada|rodovia|pra[çc]a)\s+[^\n;|]{3,100}",
+    re.I,
+)
+
+# Valores ao lado destas palavras não são o preço do imóvel
+NOT_PRICE = re.compile(r"condom|iptu|taxa|entrada|parcela|sinal", re.I)
+PER_AREA = re.compile(r"^\s*(?:/|por)\s*m(?:²|2|etro)", re.I)
+# Preferência de área: útil/privativa, depois construída; área total/terreno por último
+AREA_PRIORITY = (re.compile(r"[úu]til|privativ", re.I), re.compile(r"constru", re.I))
+RENT = re.compile(r"alug|loca[çc][ãa]o|/\s*m[êe]s|mensal", re.I)
+
+
+def _count(match) -> int | None:
+    value = next((group for group in match.groups() if group), None)
+    if value is None:
+        return None
+    value = value.lower()
+    return NUMBER_WORDS.get(value) or int(value)
+
+
+def _first_count(patterns, text: str) -> int | None:
+    for pattern in patterns:
+        for match in pattern.finditer(text):
+            value = _count(match)
+            if value is not None and 0 < value < 50:
+                return value
+    return None
+
+
+def parse_brl(number: str, scale: str | None = None) -> float:
+    """'450.000,00' -> 450000.0; '1,2' + 'milhão' -> 1200000.0."""
+    value = float(number.replace(".", "").replace(",", "."))
+    if scale:
+        scale = scale.lower()
+        value *= 1_000 if scale == "mil" else 1_000_000
+    return value
+
+
+def extract_price(text: str) -> tuple[float | None, bool]:
+    """Maior valor em R$ que não seja condomínio, IPTU, parcela etc. Retorna (preço, é_aluguel)."""
+    best, best_context = None, ""
+    for match in MONEY.finditer(text):
+        before = text[max(0, match.start() - 25): match.start()].split("\n")[-1]
+        after = text[match.end(): match.end() + 12].split("\n")[0]
+        if NOT_PRICE.search(before) or PER_AREA.search(after):
+            continue
+        value = parse_brl(match.group(1), match.group(2))
+        if best is None or value > best:
+            best, best_context = value, before + after
+    return best, bool(best_context and RENT.search(best_context))
+
+
+def extract_area(text: str) -> float | None:
+    candidates = []
+    for match in AREA.finditer(text):
+        value = float(match.group(1).replace(".", "") + ("." + match.group(2) if match.group(2) else ""))
+        if not 5 <= value <= 100_000:
+            continue
+        context = text[max(0, match.start() - 25): match.start()]
+        priority = next((i for i, pattern in enumerate(AREA_PRIORITY) if pattern.search(context)), len(AREA_PRIORITY))
+        candidates.append((priority, value))
+    return min(candidates)[1] if candidates else None
+
+
+def extract_address(text: str) -> str | None:
+    match = ADDRESS.search(text)
+    if match is None:
+        return None
+    return " ".join(match.group(0).split()).rstrip(" ,.-")
+
+
+def extract_listing(text: str) -> dict:
+    """Campos estruturados do anúncio: area_m2, price, price_per_m2, rooms, bathrooms, parking, address."""
+    price, is_rent = extract_price(text)
+    area = extract_area(text)
+    return {
+        "area_m2": area,
+        "price": price,
+        "price_type": ("rent" if is_rent else "sale") if price is not None else None,
+        "price_per_m2": round(price / area, 2) if price and area else None,
+        "rooms": _first_count(ROOMS, text),
+        "bathrooms": _first_count(BATHROOMS, text),
+        "parking": _first_count(PARKING, text),
+        "address": extract_address(text),
+    }
+
+
+def has_facts(listing: dict) -> bool:
+    return any(value is not None for value in listing.values())
+
+
+def format_facts(listing: dict) -> str:
+    """Fatos em texto para o prompt do agente (apenas os campos encontrados)."""
+    labels = {
+        "area_m2": "Área (m²)",
+        "price": "Preço (R$)",
+        "price_type": "Tipo de preço",
+        "price_per_m2": "Preço por m² (R$)",
+        "rooms": "Quartos",
+        "bathrooms": "Banheiros",
+        "parking": "Vagas",
+        "address": "Endereço",
+    }
+    lines = []
+    for key, label in labels.items():
+        value = listing.get(key)
+        if value is None:
+            continue
+        if key == "price_type":
+            value = "aluguel" if value == "rent" else "venda"
+        elif isinstance(value, float):
+            value = f"{value:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+        lines.append(f"- {label}: {value}")
+    return "\n".join(lines)
@@ -0,0 +1,167 @@
+"""Métricas de latência, erros e tokens por estágio e por endpoint, no formato texto do Prometheus.
+
+Implementação mínima e sem dependências: histogramas com buckets fixos e contadores,
+protegidos por um lock. O endpoint atual é guardado em um ContextVar, para que
+estágios internos (OCR, passos do agente, ferramentas, SMTP) sejam rotulados com
+o endpoint que os originou.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "suzukai"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, float("inf"))
+
+_endpoint = contextvars.ContextVar("metrics_endpoint", default="")
+_lock = threading.Lock()
+
+# {(nome, labels ordenados): [contagens por bucket, soma, total]}
+_histograms = {}
+# {(nome, labels ordenados): valor}
+_counters = {}
+
+_HELP = {
+    "stage_duration_seconds": ("histogram", "Latência de cada estágio (OCR, pré-processamento, passo do agente, ferramenta, SMTP)."),
+    "request_duration_seconds": ("histogram", "Latência total das requisições HTTP."),
+    "stage_errors_total": ("counter", "Erros por estágio."),
+    "requests_total": ("counter", "Requisições HTTP por endpoint e status."),
+    "tokens_total": ("counter", "Tokens de entrada e saída do LLM."),
+    "admission_wait_seconds": ("histogram", "Espera na fila de admissão por classe (OCR, agente, e-mail)."),
+    "admission_rejected_total": ("counter", "Requisições recusadas pelo controle de admissão, por motivo."),
+}
+
+
+def set_endpoint(endpoint: str):
+    return _endpoint.set(endpoint)
+
+
+def reset_endpoint(token):
+    _endpoint.reset(token)
+
+
+def current_endpoint() -> str:
+    return _endpoint.get()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name: str, seconds: float, **labels):
+    with _lock:
+        entry = _histograms.get(_key(name, labels))
+        if entry is None:
+            entry = _histograms[_key(name, labels)] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry[0][i] += 1
+        entry[1] += seconds
+        entry[2] += 1
+
+
+def inc(name: str, value: float = 1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe_stage(stage: str, seconds: float, endpoint: str | None = None):
+    observe("stage_duration_seconds", seconds, stage=stage, endpoint=current_endpoint() if endpoint is None else endpoint)
+
+
+def count_error(stage: str, endpoint: str | None = None):
+    inc("stage_errors_total", stage=stage, endpoint=current_endpoint() if endpoint is None else endpoint)
+
+
+def add_tokens(stage: str, input_tokens, output_tokens, endpoint: str | None = None):
+    endpoint = current_endpoint() if endpoint is None else endpoint
+    if input_tokens:
+        inc("tokens_total", input_tokens, stage=stage, endpoint=endpoint, direction="input")
+    if output_tokens:
+        inc("tokens_total", output_tokens, stage=stage, endpoint=endpoint, direction="output")
+
+
+@contextmanager
+def timed(stage: str, endpoint: str | None = None):
+    """Mede a duração do bloco como um estágio; exceções contam como erro do estágio."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        count_error(stage, endpoint)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - start, endpoint)
+
+
+def step_token_counts(step) -> tuple:
+    """Tokens (entrada, saída) da chamada ao modelo feita no próprio passo.
+
+    O modelo é compartilhado pelos agentes do pool, então as contagens vêm do passo ou
+    da mensagem que ele recebeu (contagens do roteador ou `usage` da resposta bruta),
+    nunca de `model.last_input_token_count`.
+    """
+    if getattr(step, "input_token_count", None) is not None:
+        return step.input_token_count, getattr(step, "output_token_count", None)
+    message = getattr(step, "model_output_message", None)
+    if getattr(message, "input_token_count", None) is not None:
+        return message.input_token_count, getattr(message, "output_token_count", None)
+    usage = getattr(getattr(message, "raw", None), "usage", None)
+    if usage is not None:
+        return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+    return None, None
+
+
+def record_agent_step(step):
+    """Callback de passo do agente: duração, erro e tokens do passo.
+
+    Grava as contagens no próprio passo (`input_token_count`/`output_token_count`),
+    onde o streaming e a interface Gradio as leem.
+    """
+    if getattr(step, "duration", None):
+        observe_stage("agent_step", step.duration)
+    if getattr(step, "error", None) is not None:
+        count_error("agent_step")
+    input_tokens, output_tokens = step_token_counts(step)
+    if input_tokens is not None:
+        step.input_token_count, step.output_token_count = input_tokens, output_tokens
+        add_tokens("llm", input_tokens, output_tokens)
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = []
+    for key, value in items:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def render() -> str:
+    """Exporta todas as métricas no formato texto do Prometheus (versão 0.0.4)."""
+    with _lock:
+        histograms = {k: (list(v[0]), v[1], v[2]) for k, v in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    names = sorted({name for name, _ in histograms} | {name for name, _ in counters})
+    for name in names:
+        full_name = f"{PREFIX}_{name}"
+        kind, help_text = _HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {kind}")
+        for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, value in zip(BUCKETS, buckets):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', le)])} {value}")
+            lines.append(f"{full_name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{full_name}_count{_format_labels(labels)} {count}")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{full_name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,177 @@
+"""Roteamento entre o modelo local (LiteLLM/ollama) e o modelo remoto (HfApiModel).
+
+O roteador se comporta como um `Model` do smolagents e pode ser passado direto ao
+`CodeAgent`. Para cada chamada ele escolhe o nível (tier) pelo tamanho do prompt,
+pelo tipo de tarefa e pelo orçamento de latência da requisição, e recorre ao
+outro nível se o escolhido falhar, estourar o tempo limite ou devolver uma resposta
+que o agente não consegue interpretar (ex.: código truncado pelo limite de tokens).
+
+O tempo limite vai para o próprio cliente HTTP de cada chamada, que roda na thread
+do agente: uma chamada que estoura o tempo é de fato encerrada, sem ocupar um pool
+de threads compartilhado.
+
+O roteador é compartilhado pelos agentes do pool, então não guarda contagens de
+tokens em si: cada resposta leva as da própria chamada (`input_token_count` e
+`output_token_count`), que também vão para o registro de roteamento.
+"""
+import copy
+import threading
+import time
+
+from smolagents.models import Model
+from smolagents.utils import parse_code_blobs
+
+from admission import check_deadline, time_left
+from routing import budget_left, current_log, current_task, estimate_tokens
+
+LOCAL = "local"
+REMOTE = "remote"
+
+
+class ModelRouter(Model):
+    def __init__(
+        self,
+        local_model: Model,
+        remote_model: Model,
+        local_tasks=("process-image",),
+        max_local_tokens: int = 6000,
+        timeouts: dict | None = None,
+        cooldown: float = 60,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.models = {LOCAL: local_model, REMOTE: remote_model}
+        self.model_id = getattr(remote_model, "model_id", None)
+        self.local_tasks = set(local_tasks)
+        self.max_local_tokens = max_local_tokens
+        self.timeouts = {LOCAL: 30, REMOTE: 120, **(timeouts or {})}
+        self.cooldown = cooldown
+        # Latência média observada por nível (EWMA), usada contra o orçamento da requisição
+        self.latency = {LOCAL: None, REMOTE: None}
+        self._unhealthy_until = {LOCAL: 0.0, REMOTE: 0.0}
+        self._lock = threading.Lock()
+
+    def choose_tier(self, messages) -> str:
+        return self._choose(current_task(), estimate_tokens(messages))
+
+    def planned_model_id(self, task: str | None, tokens: int) -> str | None:
+        """Id do modelo que deve responder uma tarefa com um prompt desse tamanho."""
+        return getattr(self.models[self._choose(task, tokens)], "model_id", None)
+
+    def _choose(self, task, tokens: int) -> str:
+        remaining = budget_left()
+
+        tier = LOCAL if task in self.local_tasks and tokens <= self.max_local_tokens else REMOTE
+
+        # Se o remoto costuma demorar mais que o orçamento restante, tenta o local
+        if tier == REMOTE and remaining is not None:
+            expected = self.latency[REMOTE]
+            if expected is not None and expected > remaining:
+                tier = LOCAL
+
+        now = time.monotonic()
+        if self._unhealthy_until[tier] > now and self._unhealthy_until[self._other(tier)] <= now:
+            tier = self._other(tier)
+        return tier
+
+    @staticmethod
+    def _other(tier: str) -> str:
+        return REMOTE if tier == LOCAL else LOCAL
+
+    def _timeout_for(self, tier: str) -> float:
+        timeout = self.timeouts[tier]
+        remaining = budget_left()
+        if remaining is not None:
+            timeout = max(1.0, min(timeout, remaining))
+        # Nunca espera o modelo além do prazo da requisição (o cliente já terá desistido)
+        left = time_left()
+        if left is not None:
+            timeout = max(0.1, min(timeout, left))
+        return timeout
+
+    @staticmethod
+    def _with_timeout(model, timeout: float, kwargs: dict):
+        """Cópia rasa do modelo para uma chamada, com o tempo limite aplicado no cliente HTTP.
+
+        O InferenceClient (HfApiModel) lê o tempo limite do próprio cliente; LiteLLM e
+        clientes OpenAI aceitam `timeout` por chamada.
+        """
+        call_model = copy.copy(model)
+        client = getattr(model, "client", None)
+        if client is not None and hasattr(client, "chat_completion"):
+            call_model.client = copy.copy(client)
+            call_model.client.timeout = timeout
+            return call_model, kwargs
+        return call_model, {**kwargs, "timeout": timeout}
+
+    @staticmethod
+    def _check_output(message, stop_sequences):
+        """Lança ValueError se um passo de código do agente não trouxer código interpretável."""
+        if "<end_code>" not in (stop_sequences or []):
+            return
+        content = getattr(message, "content", None) or ""
+        if not content.strip():
+            raise ValueError("Resposta vazia do modelo")
+        parse_code_blobs(content)
+
+    def _call_tier(self, tier, messages, validate=True, **kwargs):
+        model, kwargs = self._with_timeout(self.models[tier], self._timeout_for(tier), kwargs)
+        message = model(messages, **kwargs)
+        if validate:
+            self._check_output(message, kwargs.get("stop_sequences"))
+        return message, model
+
+    def _record(self, tier, latency, ok, fallback, error=None, tokens=(None, None)):
+        with self._lock:
+            if ok:
+                self._unhealthy_until[tier] = 0.0
+                previous = self.latency[tier]
+                self.latency[tier] = latency if previous is None else 0.7 * previous + 0.3 * latency
+            else:
+                self._unhealthy_until[tier] = time.monotonic() + self.cooldown
+        log = current_log()
+        if log is not None:
+            log.append({
+                "tier": tier,
+                "model_id": getattr(self.models[tier], "model_id", None),
+                "latency": round(latency, 3),
+                "ok": ok,
+                "fallback": fallback,
+                "error": error,
+                "input_tokens": tokens[0],
+                "output_tokens": tokens[1],
+            })
+
+    def __call__(self, messages, **kwargs):
+        first = self.choose_tier(messages)
+        for tier in (first, self._other(first)):
+            fallback = tier != first
+            check_deadline()
+            start = time.perf_counter()
+            try:
+                # Na última tentativa a resposta segue como veio: o agente trata o erro de parsing
+                response, model = self._call_tier(tier, messages, validate=not fallback, **kwargs)
+            except Exception as e:
+                # Tempo esgotado pelo prazo do cliente não marca o nível como fora do ar
+                check_deadline()
+                self._record(tier, time.perf_counter() - start, ok=False, fallback=fallback, error=str(e))
+                if fallback:
+                    raise
+                continue
+            # Contagens da cópia usada nesta chamada, sem disputa entre agentes concorrentes
+            tokens = (getattr(model, "last_input_token_count", None), getattr(model, "last_output_token_count", None))
+            response.input_token_count, response.output_token_count = tokens
+            self._record(tier, time.perf_counter() - start, ok=True, fallback=fallback, tokens=tokens)
+            return response
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                tier: {
+                    "model_id": getattr(self.models[tier], "model_id", None),
+                    "avg_latency": round(self.latency[tier], 3) if self.latency[tier] is not None else None,
+                    "healthy": self._unhealthy_until[tier] <= now,
+                }
+                for tier in (LOCAL, REMOTE)
+            }
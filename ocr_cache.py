@@ -0,0 +1,98 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from cache import LRUCache, SingleFlight
+
+
+class OCRCache:
+    """Cache de resultados de OCR endereçado pelo conteúdo da imagem.
+
+    Possui duas camadas: um LRU em memória (por processo) e um SQLite em disco,
+    que sobrevive a reinicializações e é compartilhado entre os workers.
+    Requisições simultâneas para a mesma imagem aguardam um único OCR.
+
+    A chave combina os bytes da imagem com todas as configurações que mudam o texto
+    reconhecido (idioma, config do Tesseract, resolução alvo, decodificação reduzida,
+    pré-processamento e modo de OCR).
+    """
+
+    def __init__(self, path: str = "ocr_cache.sqlite3", memory_size: int = 256):
+        self.path = path
+        self.memory = LRUCache(max_size=memory_size)
+        self.inflight = SingleFlight()
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.computed = 0
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_results ("
+                " key TEXT PRIMARY KEY,"
+                " text TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def make_key(data: bytes, settings: dict) -> str:
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _disk_get(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT text FROM ocr_results WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.disk_misses += 1
+            else:
+                self.disk_hits += 1
+        return row[0] if row else None
+
+    def _disk_set(self, key, text):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, text, created_at) VALUES (?, ?, ?)",
+                (key, text, time.time()),
+            )
+
+    def get_or_compute(self, data: bytes, settings: dict, compute) -> str:
+        """Retorna o texto em cache ou executa `compute()` uma única vez e armazena o resultado."""
+        key = self.make_key(data, settings)
+
+        text = self.memory.get(key)
+        if text is not None:
+            return text
+
+        return self.inflight.do(key, self._load_or_compute, key, compute)
+
+    def _load_or_compute(self, key, compute):
+        text = self._disk_get(key)
+        if text is None:
+            text = compute()
+            with self._lock:
+                self.computed += 1
+            self._disk_set(key, text)
+        self.memory.set(key, text)
+        return text
+
+    def stats(self) -> dict:
+        with self._lock:
+            disk = {"hits": self.disk_hits, "misses": self.disk_misses}
+            computed = self.computed
+        return {
+            "memory": self.memory.stats(),
+            "disk": disk,
+            "inflight_shared": self.inflight.shared,
+            "ocr_runs": computed,
+        }
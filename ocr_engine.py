@@ -0,0 +1,445 @@
+import collections
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from admission import DeadlineExceeded, deadline_exceeded, time_left
+
+
+class OCRQueueFull(Exception):
+    """A fila de OCR está cheia; o chamador deve tentar novamente mais tarde."""
+
+
+class OCRTimeout(Exception):
+    """O OCR não terminou dentro do tempo limite."""
+
+
+# Decodificação reduzida (modo draft do JPEG) quando a imagem excede a resolução alvo
+DRAFT_DECODE = os.getenv("OCR_DRAFT_DECODE", "true").lower() in ("1", "true", "yes")
+
+# Workers criados por um processo servidor limpo (forkserver) ou por spawn, nunca por
+# fork direto: o processo da API tem várias threads e um fork herdaria locks presos
+START_METHOD = os.getenv("OCR_START_METHOD") or (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+# Módulos carregados uma vez no servidor de fork, herdados por cada worker novo
+FORKSERVER_PRELOAD = ["ocr_engine", "preprocessing", "regions"]
+
+# PSM padrão do Tesseract (3 = segmentação automática da página)
+DEFAULT_PSM = 3
+
+# Estado de cada processo worker: APIs do Tesseract já carregadas, por idioma
+_worker_apis = {}
+
+
+def _worker_init():
+    # Ignora Ctrl+C nos workers; quem encerra o pool é o processo principal
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _rss_mb() -> dict:
+    """RSS atual (VmRSS) e pico (VmHWM) do processo, em MB; vazio fora do Linux."""
+    found = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    name, value = line.split()[:2]
+                    found[name[:-1]] = int(value) / 1024
+    except OSError:
+        pass
+    return found
+
+
+def _reset_peak_rss() -> bool:
+    """Zera o pico de RSS (VmHWM) do processo, para medir o pico de um único job (Linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def tesserocr_available() -> bool:
+    """O `tesserocr` é opcional (precisa da libtesseract para compilar) e não está no requirements.txt.
+
+    Sem ele cada imagem inicia um processo `tesseract` via pytesseract e recarrega o
+    modelo de idioma; os workers persistentes continuam evitando o custo de processo
+    do Python, mas não o do Tesseract.
+    """
+    import importlib.util
+    return importlib.util.find_spec("tesserocr") is not None
+
+
+def _get_tesserocr_api(lang):
+    """Retorna uma instância persistente do Tesseract (tesserocr), ou None se indisponível."""
+    if lang in _worker_apis:
+        return _worker_apis[lang]
+    try:
+        import tesserocr
+        api = tesserocr.PyTessBaseAPI(lang=lang)
+    except Exception:
+        api = None
+    _worker_apis[lang] = api
+    return api
+
+
+def open_image(data: bytes, target_dpi: int = 300, draft: bool = True):
+    """Decodifica a imagem validando as dimensões pelo cabeçalho antes de ler os pixels.
+
+    Para JPEG, usa o modo draft do PIL: o decodificador reduz a imagem por 1/2, 1/4 ou 1/8
+    enquanto ela continuar maior que o necessário para `target_dpi` numa página A4,
+    o que corta memória e tempo de decodificação de fotos grandes.
+    Retorna (imagem, escala_do_draft).
+    """
+    from PIL import Image
+    from preprocessing import PAGE_LONG_SIDE_INCHES
+    from uploads import check_image_size
+
+    # BytesIO sobre `bytes` não copia o buffer
+    image = Image.open(io.BytesIO(data))
+    check_image_size(*image.size)
+
+    scale = 1.0
+    if draft and image.format == "JPEG":
+        width, height = image.size
+        dpi = image.info.get("dpi", (0, 0))[0]
+        if dpi and dpi > target_dpi:
+            wanted = target_dpi / dpi
+        else:
+            wanted = target_dpi * PAGE_LONG_SIDE_INCHES / max(width, height)
+        if wanted < 0.5:
+            image.draft(image.mode, (int(width * wanted), int(height * wanted)))
+            scale = image.size[0] / width
+    image.load()
+    return image, scale
+
+
+def load_image(data: bytes, preprocess=(), target_dpi: int = 300):
+    """Decodifica e pré-processa a imagem. Retorna (imagem, segundos_de_decodificação, tempos_pre_ms, memória)."""
+    start = time.perf_counter()
+    image, draft_scale = open_image(data, target_dpi, DRAFT_DECODE)
+    decode_seconds = time.perf_counter() - start
+    memory = {
+        "upload_bytes": len(data),
+        "decoded_bytes": image.width * image.height * len(image.getbands()),
+        "draft_scale": draft_scale,
+    }
+
+    timings = {}
+    if preprocess:
+        from preprocessing import preprocess as run_preprocess
+        image, timings = run_preprocess(image, preprocess, target_dpi)
+    return image, decode_seconds, timings, memory
+
+
+def run_tesseract(image, lang: str = "eng", config: str = "", psm: int | None = None) -> str:
+    """OCR de uma imagem já decodificada, com modo de segmentação de página (PSM) opcional."""
+    api = None if config else _get_tesserocr_api(lang)
+    if api is not None:
+        # Modelo de idioma já carregado: evita iniciar um processo `tesseract` por imagem
+        if psm is not None:
+            api.SetPageSegMode(psm)
+        api.SetImage(image)
+        text = api.GetUTF8Text()
+        api.Clear()
+        if psm is not None:
+            api.SetPageSegMode(DEFAULT_PSM)
+        return text
+
+    import pytesseract
+    if psm is not None:
+        config = f"{config} --psm {psm}".strip()
+    return pytesseract.image_to_string(image, lang=lang, config=config)
+
+
+def ocr_job(data: bytes, lang: str = "eng", config: str = "", preprocess=(), target_dpi: int = 300, psm: int | None = None) -> dict:
+    """Executa o pré-processamento (opcional) e o OCR de uma imagem em bytes. Roda dentro do worker.
+
+    A memória é medida no próprio job: RSS do worker antes e depois e, no Linux, o pico
+    durante o job (o pico do processo é zerado antes de começar).
+    """
+    peak_reset = _reset_peak_rss()
+    before = _rss_mb()
+    image, decode_seconds, timings, memory = load_image(data, preprocess, target_dpi)
+
+    start = time.perf_counter()
+    text = run_tesseract(image, lang, config, psm)
+    tesseract_seconds = time.perf_counter() - start
+
+    after = _rss_mb()
+    if "VmRSS" in before and "VmRSS" in after:
+        memory["rss_before_mb"] = round(before["VmRSS"], 1)
+        memory["rss_after_mb"] = round(after["VmRSS"], 1)
+    if peak_reset and "VmHWM" in after:
+        memory["job_peak_rss_mb"] = round(after["VmHWM"], 1)
+    return {
+        "text": text.strip(),
+        "preprocessing": timings,
+        "timings": {"decode": decode_seconds, "tesseract": tesseract_seconds},
+        "memory": memory,
+    }
+
+
+def ocr_bytes(data: bytes, lang: str = "eng", config: str = "") -> str:
+    return ocr_job(data, lang, config)["text"]
+
+
+class OCREngine:
+    """Pool de workers de OCR de longa duração.
+
+    Cada worker mantém os modelos de idioma carregados entre os jobs (quando o
+    `tesserocr` está instalado) e é reciclado após `max_jobs_per_worker` jobs.
+    A fila de submissão é limitada e cada job tem um tempo limite: um job que
+    estoura o tempo recicla o pool (o worker travado é encerrado e os outros jobs
+    em andamento são reenviados ao pool novo), para que não prenda vagas para sempre.
+    O prazo de uma requisição nunca recicla o pool: esgotado, a requisição só deixa
+    de esperar e o job continua, vigiado pelo tempo limite do próprio OCR.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        queue_size: int = 32,
+        timeout: float = 60,
+        max_jobs_per_worker: int = 200,
+    ):
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._slots = threading.BoundedSemaphore(self.workers + queue_size)
+        self._pool = None
+        # Geração do pool atual e jobs em andamento: {Future: (geração, func, args)}
+        self._generation = 0
+        self._inflight = {}
+        self.recycled = 0
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            return self._get_pool_locked()
+
+    def _get_pool_locked(self):
+        if self._pool is None:
+            ctx = multiprocessing.get_context(START_METHOD)
+            if START_METHOD == "forkserver":
+                ctx.set_forkserver_preload(FORKSERVER_PRELOAD)
+            self._pool = ctx.Pool(
+                processes=self.workers,
+                initializer=_worker_init,
+                maxtasksperchild=self.max_jobs_per_worker,
+            )
+        return self._pool
+
+    def submit(self, func, *args) -> Future:
+        """Envia um job ao pool e retorna um Future. Lança OCRQueueFull se a fila estiver cheia."""
+        if not self._slots.acquire(blocking=False):
+            raise OCRQueueFull("Fila de OCR cheia, tente novamente em instantes.")
+
+        future = Future()
+        try:
+            self._dispatch(future, func, args)
+        except Exception:
+            self._slots.release()
+            raise
+        return future
+
+    def _dispatch(self, future, func, args):
+        # Pool e geração lidos juntos: um job nunca vai para um pool já em reciclagem
+        with self._lock:
+            pool = self._get_pool_locked()
+            generation = self._generation
+            self._inflight[future] = (generation, func, args)
+            try:
+                pool.apply_async(
+                    func,
+                    args,
+                    callback=lambda value: self._finish(future, generation, value=value),
+                    error_callback=lambda error: self._finish(future, generation, error=error),
+                )
+            except Exception:
+                del self._inflight[future]
+                raise
+
+    def _finish(self, future, generation, value=None, error=None):
+        # O slot só é liberado quando o job realmente termina (ou é descartado na reciclagem)
+        with self._lock:
+            entry = self._inflight.get(future)
+            if entry is None or entry[0] != generation:
+                return
+            del self._inflight[future]
+        self._slots.release()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def _recycle(self, stuck: Future, generation: int | None = None):
+        """Encerra o pool com o job travado e reenvia ao pool novo os demais jobs em andamento.
+
+        Com `generation`, só recicla se o job ainda estiver naquela geração (não foi reenviado).
+        """
+        with self._lock:
+            entry = self._inflight.get(stuck)
+            if entry is None or (generation is not None and entry[0] != generation):
+                return
+            del self._inflight[stuck]
+            pool = self._pool if entry[0] == self._generation else None
+            if pool is not None:
+                self._pool = None
+                self._generation += 1
+                self.recycled += 1
+                retry = [(f, func, args) for f, (gen, func, args) in self._inflight.items() if gen == entry[0]]
+            else:
+                retry = []
+        self._slots.release()
+
+        if pool is not None:
+            # terminate() mata o processo preso no Tesseract; roda fora do caminho da requisição
+            threading.Thread(target=pool.terminate, name="ocr-recycle", daemon=True).start()
+        for future, func, args in retry:
+            try:
+                self._dispatch(future, func, args)
+            except Exception as e:
+                self._finish(future, self._generation, error=e)
+
+    def ocr(
+        self,
+        data: bytes,
+        lang: str = "eng",
+        config: str = "",
+        preprocess=(),
+        target_dpi: int = 300,
+        timeout: float | None = None,
+    ) -> dict:
+        """Retorna {'text': ..., 'preprocessing': {estágio: ms}, 'timings': {...}, 'memory': {...}}."""
+        if self.workers <= 0:
+            return ocr_job(data, lang, config, tuple(preprocess), target_dpi)
+
+        return self._get(self.submit(ocr_job, data, lang, config, tuple(preprocess), target_dpi), timeout)
+
+    def _get(self, future, timeout: float | None = None):
+        timeout = self.timeout if timeout is None else timeout
+        left = time_left()
+        if left is not None and left < timeout:
+            # O prazo do cliente acaba antes: para de esperar sem derrubar os jobs dos outros
+            try:
+                return future.result(max(0.0, left))
+            except FutureTimeout as e:
+                self._watch(future, timeout - max(0.0, left))
+                raise deadline_exceeded() from e
+        try:
+            return future.result(timeout)
+        except FutureTimeout as e:
+            self._recycle(future)
+            raise OCRTimeout(f"OCR excedeu o tempo limite de {timeout:g}s") from e
+
+    def _watch(self, future, timeout: float):
+        """Recicla o pool se um job abandonado pela requisição não terminar dentro de `timeout`."""
+        with self._lock:
+            entry = self._inflight.get(future)
+        if entry is not None:
+            timer = threading.Timer(timeout, self._recycle, (future, entry[0]))
+            timer.daemon = True
+            timer.start()
+
+    def map(self, func, args_list, timeout: float | None = None) -> list:
+        """Executa `func` para cada tupla de argumentos, com no máximo `workers` jobs em voo; mantém a ordem."""
+        if self.workers <= 0:
+            return [func(*args) for args in args_list]
+
+        results, pending = [], collections.deque()
+        try:
+            for args in args_list:
+                if len(pending) >= self.workers:
+                    results.append(self._get(pending.popleft(), timeout))
+                pending.append(self.submit(func, *args))
+            while pending:
+                results.append(self._get(pending.popleft(), timeout))
+        except DeadlineExceeded:
+            # Os jobs ainda em voo seguem no pool, vigiados pelo tempo limite do OCR
+            for future in pending:
+                self._watch(future, self.timeout if timeout is None else timeout)
+            raise
+        return results
+
+    def ocr_regions(
+        self,
+        data: bytes,
+        lang: str = "eng",
+        config: str = "",
+        preprocess=(),
+        target_dpi: int = 300,
+        mode: str = "regions",
+        timeout: float | None = None,
+    ) -> dict:
+        """OCR por regiões de texto ou faixas (ver regions.py), com as regiões reconhecidas em paralelo.
+
+        Mesmo formato de `ocr`, com 'regions' (quantidade de recortes; 0 = página inteira).
+        """
+        from regions import regions_job
+
+        (planned,) = self.map(regions_job, [(data, lang, config, tuple(preprocess), target_dpi, mode)], timeout)
+        if planned["regions"] == 0:
+            return planned
+
+        regions = planned["regions"]
+        start = time.perf_counter()
+        results = self.map(
+            ocr_job,
+            [(region["data"], lang, config, (), target_dpi, region["psm"]) for region in regions],
+            timeout,
+        )
+        planned["timings"]["tesseract"] = time.perf_counter() - start
+
+        # Regiões já vêm em ordem de leitura; faixas são partes contínuas da mesma página
+        separator = "\n" if regions[0]["psm"] is None else "\n\n"
+        planned["text"] = separator.join(result["text"] for result in results if result["text"])
+        planned["regions"] = len(regions)
+        return planned
+
+    def image_to_string(self, data: bytes, lang: str = "eng", config: str = "", timeout: float | None = None) -> str:
+        return self.ocr(data, lang, config, timeout=timeout)["text"]
+
+    def warmup(self):
+        """Cria os processos workers antecipadamente."""
+        if self.workers > 0:
+            self._get_pool()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+
+_default_engine = None
+_default_lock = threading.Lock()
+
+
+def get_engine() -> OCREngine:
+    """Engine compartilhada pelo processo, configurada por variáveis de ambiente."""
+    global _default_engine
+    with _default_lock:
+        if _default_engine is None:
+            workers = os.getenv("OCR_WORKERS")
+            _default_engine = OCREngine(
+                workers=int(workers) if workers else None,
+                queue_size=int(os.getenv("OCR_QUEUE_SIZE", "32")),
+                timeout=float(os.getenv("OCR_TIMEOUT", "60")),
+                max_jobs_per_worker=int(os.getenv("OCR_MAX_JOBS_PER_WORKER", "200")),
+            )
+            if not tesserocr_available():
+                print(
+                    "Aviso: tesserocr não instalado; o OCR usa pytesseract, com um processo tesseract "
+                    "por imagem. Instale tesserocr (pip install tesserocr, requer libtesseract) para "
+                    "manter os modelos de idioma carregados nos workers."
+                )
+        return _default_engine
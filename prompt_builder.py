@@ -0,0 +1,132 @@
+"""Montagem dos prompts das tarefas com orçamento de tokens.
+
+O texto do OCR é limpo (ruído de digitalização), contado com tiktoken e reduzido
+ao orçamento configurado antes de entrar no prompt do agente.
+"""
+import functools
+import os
+import re
+
+# Conjuntos de templates do agente disponíveis (PROMPT_TEMPLATE_SET)
+TEMPLATE_SETS = {
+    "default": "prompts.yaml",
+    "compact": "prompts_compact.yaml",
+}
+
+# Templates das tarefas, formatados com str.format
+TASK_TEMPLATES = {
+    "analyze-image": (
+        "Você é um corretor de imóveis e deverá fazer uma avaliação do imóvel com base no seguinte texto extraído: "
+        "{text}\n\n"
+        "Por favor, forneça:\n"
+        "1. Uma avaliação detalhada do imóvel\n"
+        "2. Pontos de interesse próximos (escolas, hospitais, comércio, etc.)\n"
+        "3. Preço médio do imóvel e valor por metragem\n"
+        "4. Qualquer observação relevante sobre o imóvel\n\n"
+        "Para pesquisar os pontos de interesse e os preços da região, faça todas as consultas de uma vez "
+        "com a ferramenta multi_web_search.\n\n"
+        "Responda em português brasileiro de forma profissional e detalhada."
+    ),
+    "process-image": "Texto extraído da imagem: {text}\n\nPergunta do usuário: {question}",
+    "process-images": "Texto extraído das imagens:\n{text}\n\nPergunta do usuário: {question}",
+}
+
+# Fatos extraídos por regras (ver listing.py), inseridos antes do texto para o agente não recalculá-los
+FACTS_TEMPLATE = (
+    "Dados já extraídos do anúncio (confiáveis; use-os como estão, sem recalcular área, preço ou preço por m²):\n"
+    "{facts}\n\n"
+)
+
+# Linhas com palavras como estas são mantidas primeiro ao resumir
+KEYWORDS = re.compile(r"r\$|m²|m2|quarto|banheiro|vaga|su[ií]te|rua|av\.|avenida|bairro|pre[çc]o|valor|[áa]rea", re.I)
+
+
+def template_path(name: str | None = None) -> str:
+    name = name or os.getenv("PROMPT_TEMPLATE_SET", "default")
+    if name not in TEMPLATE_SETS:
+        raise ValueError(f"Conjunto de templates desconhecido: '{name}'")
+    return TEMPLATE_SETS[name]
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Sem tiktoken (ou sem acesso ao arquivo BPE): usa a estimativa de ~4 caracteres por token
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def clean_ocr_text(text: str) -> str:
+    """Remove ruído típico de OCR: linhas só com símbolos, caracteres repetidos e espaços extras."""
+    lines = []
+    for line in text.splitlines():
+        line = re.sub(r"[ \t]+", " ", line).strip()
+        line = re.sub(r"([^\w\s])\1{3,}", r"\1", line)  # ex.: '-----' ou '.....'
+        if not line:
+            continue
+        alnum = sum(ch.isalnum() for ch in line)
+        if alnum < 2 or alnum / len(line) < 0.4:
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def truncate_to_budget(text: str, max_tokens: int) -> str:
+    encoding = _encoding()
+    if encoding is None:
+        return text[: max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:max_tokens])
+
+
+def summarize_to_budget(text: str, max_tokens: int) -> str:
+    """Resumo extrativo: mantém primeiro as linhas com números e palavras-chave, na ordem original."""
+    lines = text.splitlines()
+    ranked = sorted(
+        range(len(lines)),
+        key=lambda i: (not KEYWORDS.search(lines[i]), not re.search(r"\d", lines[i]), i),
+    )
+    keep, used = set(), 0
+    for i in ranked:
+        cost = count_tokens(lines[i]) + 1
+        if used + cost > max_tokens:
+            continue
+        keep.add(i)
+        used += cost
+    return "\n".join(lines[i] for i in sorted(keep))
+
+
+def fit_text(text: str, max_tokens: int | None, strategy: str = "summarize") -> str:
+    if not max_tokens or count_tokens(text) <= max_tokens:
+        return text
+    if strategy == "summarize":
+        return summarize_to_budget(text, max_tokens)
+    return truncate_to_budget(text, max_tokens) + "\n[...]"
+
+
+def build_task_prompt(task: str, extracted_text: str, question: str = "", max_tokens: int | None = None, facts: str = ""):
+    """Monta o prompt da tarefa, com os fatos já extraídos (opcional) no início. Retorna (prompt, contagem de tokens)."""
+    if max_tokens is None:
+        max_tokens = int(os.getenv("OCR_TEXT_TOKEN_BUDGET", "1500"))
+    strategy = os.getenv("OCR_TEXT_STRATEGY", "summarize")
+
+    cleaned = clean_ocr_text(extracted_text)
+    fitted = fit_text(cleaned, max_tokens, strategy)
+    prompt = TASK_TEMPLATES[task].format(text=fitted, question=question)
+    if facts:
+        prompt = FACTS_TEMPLATE.format(facts=facts) + prompt
+
+    return prompt, {
+        "ocr_text": count_tokens(extracted_text),
+        "ocr_text_used": count_tokens(fitted),
+        "prompt": count_tokens(prompt),
+    }
@@ -0,0 +1,211 @@
+"""Detecção barata de regiões de texto e divisão de páginas grandes em faixas (tiles).
+
+A detecção roda sobre uma versão reduzida da imagem: o gradiente local marca
+bordas de caracteres, uma média horizontal junta letras em linhas e um XY-cut
+recursivo separa os blocos. Os blocos saem em ordem de leitura (de cima para
+baixo, da esquerda para a direita) e cada um recebe um PSM adequado: linha única
+(7), só quando a altura do bloco é próxima da altura das suas linhas, ou bloco
+uniforme (6). Cada região é então reconhecida em paralelo.
+"""
+import io
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+MODES = ("page", "regions", "tiles", "auto")
+
+PSM_BLOCK = 6
+PSM_LINE = 7
+
+# Lado máximo da imagem usada na detecção
+DETECT_MAX_SIDE = 1000
+# Acima desta fração da página coberta por texto, recortar não compensa
+MAX_COVERAGE = float(os.getenv("OCR_REGIONS_MAX_COVERAGE", "0.6"))
+MAX_REGIONS = int(os.getenv("OCR_MAX_REGIONS", "32"))
+# Altura de cada faixa no modo 'tiles' e tamanho a partir do qual o modo 'auto' recorta
+TILE_HEIGHT = int(os.getenv("OCR_TILE_HEIGHT", "2000"))
+AUTO_MIN_PIXELS = int(os.getenv("OCR_AUTO_MIN_PIXELS", str(4_000_000)))
+
+
+def parse_mode(value: str | None) -> str:
+    mode = (value or "page").strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"Modo de OCR desconhecido: {mode} (use {', '.join(MODES)})")
+    return mode
+
+
+def _runs(profile: np.ndarray, min_gap: int) -> list[tuple[int, int]]:
+    """Intervalos [início, fim) de valores verdadeiros, unindo buracos menores que `min_gap`."""
+    indices = np.flatnonzero(profile)
+    if indices.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) > min_gap)
+    starts = np.concatenate(([indices[0]], indices[breaks + 1]))
+    ends = np.concatenate((indices[breaks], [indices[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def reduce_for_detection(image: Image.Image) -> tuple[np.ndarray, int]:
+    """Imagem em tons de cinza reduzida por um fator inteiro. Retorna (array, fator)."""
+    gray = image.convert("L")
+    factor = max(1, -(-max(gray.size) // DETECT_MAX_SIDE))
+    if factor > 1:
+        gray = gray.reduce(factor)
+    return np.asarray(gray, dtype=np.float32), factor
+
+
+def text_mask(gray: np.ndarray) -> np.ndarray:
+    """Máscara das áreas com densidade de bordas típica de texto."""
+    gx = np.abs(np.diff(gray, axis=1))[:-1, :]
+    gy = np.abs(np.diff(gray, axis=0))[:, :-1]
+    edges = (gx + gy) > max(24.0, float((gx + gy).mean() * 3))
+
+    # Média horizontal (via soma acumulada) para juntar os caracteres de uma mesma linha
+    width = max(3, gray.shape[1] // 80)
+    cumsum = np.cumsum(np.pad(edges, ((0, 0), (1, 0))).astype(np.int32), axis=1)
+    padded = np.pad(cumsum, ((0, 0), (width // 2, width - width // 2)), mode="edge")
+    density = (padded[:, width:] - padded[:, :-width])[:, : edges.shape[1]] / width
+    return density > 0.08
+
+
+def line_height(mask: np.ndarray, strips: int = 20) -> float:
+    """Altura típica de uma linha de texto, medida em faixas verticais estreitas.
+
+    Em um bloco levemente inclinado as linhas se sobrepõem no perfil horizontal
+    do bloco inteiro, mas continuam separadas dentro de uma faixa estreita. Faixas
+    sem ascendentes ou descendentes medem menos que a linha, por isso o percentil 90
+    em vez da mediana.
+    """
+    width = max(8, mask.shape[1] // strips)
+    heights = [
+        bottom - top
+        for left in range(0, mask.shape[1], width)
+        for top, bottom in _runs(mask[:, left:left + width].any(axis=1), 1)
+    ]
+    return float(np.percentile(heights, 90)) if heights else 0.0
+
+
+def _xy_cut(mask, x0, y0, row_gap, col_gap, out, depth=0):
+    rows = _runs(mask.any(axis=1), row_gap)
+    if not rows:
+        return
+    for top, bottom in rows:
+        band = mask[top:bottom]
+        cols = _runs(band.any(axis=0), col_gap)
+        if depth < 6 and (len(rows) > 1 or len(cols) > 1):
+            for left, right in cols:
+                _xy_cut(band[:, left:right], x0 + left, y0 + top, row_gap, col_gap, out, depth + 1)
+        else:
+            left, right = cols[0][0], cols[-1][1]
+            out.append((x0 + left, y0 + top, x0 + right, y0 + bottom))
+
+
+def detect_regions(image: Image.Image) -> list[dict]:
+    """Blocos de texto em ordem de leitura: [{'box': (x0, y0, x1, y1), 'psm': ...}] em pixels da imagem original."""
+    gray, factor = reduce_for_detection(image)
+    if min(gray.shape) < 8:
+        return []
+    mask = text_mask(gray)
+    height, width = mask.shape
+
+    blocks = []
+    _xy_cut(mask, 0, 0, max(3, height // 60), max(4, width // 40), blocks)
+
+    min_area = height * width * 0.0001
+    pad = 2
+    regions = []
+    for x0, y0, x1, y1 in blocks:
+        if (x1 - x0) * (y1 - y0) < min_area or y1 - y0 < 3:
+            continue
+        box = (
+            max(0, (x0 - pad) * factor),
+            max(0, (y0 - pad) * factor),
+            min(image.width, (x1 + pad) * factor),
+            min(image.height, (y1 + pad) * factor),
+        )
+        # Linhas inclinadas se fundem no perfil do bloco; a altura decide se é uma linha só
+        single_line = y1 - y0 <= 1.5 * line_height(mask[y0:y1, x0:x1])
+        regions.append({"box": box, "psm": PSM_LINE if single_line else PSM_BLOCK})
+    return regions
+
+
+def tile_boxes(image: Image.Image, tile_height: int = TILE_HEIGHT) -> list[tuple]:
+    """Divide a página em faixas horizontais, cortando nas linhas com menos tinta para não partir o texto."""
+    if image.height <= tile_height * 1.5:
+        return [(0, 0, image.width, image.height)]
+
+    gray, factor = reduce_for_detection(image)
+    ink = text_mask(gray).sum(axis=1)
+    boxes, top = [], 0
+    while image.height - top > tile_height * 1.5:
+        target = (top + tile_height) // factor
+        window = max(1, tile_height // factor // 10)
+        low, high = max(0, target - window), min(len(ink), target + window)
+        cut = (low + int(np.argmin(ink[low:high]))) * factor if high > low else top + tile_height
+        boxes.append((0, top, image.width, cut))
+        top = cut
+    boxes.append((0, top, image.width, image.height))
+    return boxes
+
+
+def plan(image: Image.Image, mode: str, tile_height: int = TILE_HEIGHT, max_regions: int = MAX_REGIONS) -> list[dict]:
+    """Regiões a reconhecer para o modo pedido; lista vazia significa OCR da página inteira."""
+    if mode == "auto":
+        if image.width * image.height < AUTO_MIN_PIXELS:
+            return []
+        mode = "tiles" if image.height > tile_height * 1.5 and image.height > image.width * 2 else "regions"
+
+    if mode == "tiles":
+        boxes = tile_boxes(image, tile_height)
+        return [{"box": box, "psm": None} for box in boxes] if len(boxes) > 1 else []
+
+    if mode == "regions":
+        regions = detect_regions(image)
+        area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in (r["box"] for r in regions))
+        if not regions or len(regions) > max_regions or area > MAX_COVERAGE * image.width * image.height:
+            return []
+        return regions
+    return []
+
+
+def encode_crop(image: Image.Image, box) -> bytes:
+    buffer = io.BytesIO()
+    image.crop(box).save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def regions_job(
+    data: bytes,
+    lang: str = "eng",
+    config: str = "",
+    preprocess=(),
+    target_dpi: int = 300,
+    mode: str = "regions",
+    tile_height: int = TILE_HEIGHT,
+    max_regions: int = MAX_REGIONS,
+) -> dict:
+    """Decodifica, pré-processa e planeja as regiões. Roda dentro do worker.
+
+    Se recortar não compensar, faz o OCR da página ali mesmo e devolve 'text';
+    caso contrário devolve os recortes em 'regions', na ordem de leitura.
+    """
+    from ocr_engine import load_image, run_tesseract
+
+    image, decode_seconds, timings, memory = load_image(data, preprocess, target_dpi)
+
+    start = time.perf_counter()
+    regions = plan(image, mode, tile_height, max_regions)
+    detect_seconds = time.perf_counter() - start
+    result = {"preprocessing": timings, "memory": memory, "timings": {"decode": decode_seconds, "detect": detect_seconds}}
+
+    if not regions:
+        start = time.perf_counter()
+        result["text"] = run_tesseract(image, lang, config).strip()
+        result["timings"]["tesseract"] = time.perf_counter() - start
+        result["regions"] = 0
+        return result
+
+    result["regions"] = [dict(region, data=encode_crop(image, region["box"])) for region in regions]
+    return result
@@ -0,0 +1,54 @@
+"""Contexto de roteamento por requisição (tarefa, orçamento de latência e registro das chamadas).
+
+Fica separado de model_router.py para poder ser importado sem carregar o smolagents.
+
+O orçamento de latência só orienta a escolha do modelo (e o tempo limite de cada
+chamada); não é o prazo da requisição (admission.py), que interrompe o trabalho.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+_task = contextvars.ContextVar("routing_task", default=None)
+_budget_end = contextvars.ContextVar("routing_budget_end", default=None)
+_log = contextvars.ContextVar("routing_log", default=None)
+
+
+@contextmanager
+def routing_context(task: str | None = None, latency_budget: float | None = None):
+    """Define a tarefa e o orçamento (em segundos) da requisição e coleta o nível usado em cada chamada."""
+    log = []
+    budget_end = time.monotonic() + latency_budget if latency_budget else None
+    tokens = (_task.set(task), _budget_end.set(budget_end), _log.set(log))
+    try:
+        yield log
+    finally:
+        _log.reset(tokens[2])
+        _budget_end.reset(tokens[1])
+        _task.reset(tokens[0])
+
+
+def current_task():
+    return _task.get()
+
+
+def budget_left() -> float | None:
+    """Segundos restantes do orçamento de latência, ou None se a requisição não definiu um."""
+    budget_end = _budget_end.get()
+    return None if budget_end is None else budget_end - time.monotonic()
+
+
+def current_log():
+    return _log.get()
+
+
+def estimate_tokens(messages) -> int:
+    """Estimativa barata (~4 caracteres por token) do tamanho do prompt."""
+    chars = 0
+    for message in messages:
+        content = message["content"] if isinstance(message, dict) else getattr(message, "content", "")
+        if isinstance(content, list):
+            chars += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+        else:
+            chars += len(str(content or ""))
+    return chars // 4
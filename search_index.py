@@ -0,0 +1,201 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+
+class SearchIndex:
+    """Índice de texto completo (SQLite FTS5) de textos extraídos, prompts e respostas.
+
+    As escritas entram em uma fila e são gravadas em lote por uma thread em segundo
+    plano, fora do caminho da requisição. Cada entrada tem uma chave única (o hash
+    usado pelos caches), de modo que reindexar o mesmo conteúdo apenas o substitui,
+    e guarda em `source` o endpoint que a produziu (ex.: '/process-image').
+    """
+
+    def __init__(
+        self,
+        path: str = "search_index.sqlite3",
+        batch_size: int = 64,
+        flush_interval: float = 1.0,
+        queue_size: int = 10000,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._writer = None
+        self.written = 0
+        self.dropped = 0
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Sem isso, o REPLACE de uma chave existente não dispara o trigger de remoção do FTS
+        conn.execute("PRAGMA recursive_triggers=ON")
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT UNIQUE NOT NULL,
+                    kind TEXT NOT NULL,
+                    task TEXT NOT NULL DEFAULT '',
+                    source TEXT NOT NULL DEFAULT '',
+                    text TEXT NOT NULL DEFAULT '',
+                    prompt TEXT NOT NULL DEFAULT '',
+                    answer TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+                    text, prompt, answer,
+                    content='entries', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+                    INSERT INTO entries_fts(rowid, text, prompt, answer)
+                    VALUES (new.id, new.text, new.prompt, new.answer);
+                END;
+                CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+                    INSERT INTO entries_fts(entries_fts, rowid, text, prompt, answer)
+                    VALUES ('delete', old.id, old.text, old.prompt, old.answer);
+                END;
+                """
+            )
+
+    def add(self, key: str, kind: str, text: str = "", prompt: str = "", answer: str = "", task: str = "", source: str = ""):
+        """Enfileira uma entrada para indexação; nunca bloqueia (descarta se a fila estiver cheia)."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((key, kind, task, source, text or "", prompt or "", answer or "", time.time()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="search-index", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"Erro ao gravar no índice de busca: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        with self._connect() as conn:
+            # REPLACE remove a linha antiga (disparando o trigger de remoção no FTS) e insere a nova
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, kind, task, source, text, prompt, answer, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+        with self._lock:
+            self.written += len(batch)
+
+    def flush(self):
+        """Aguarda até que todas as entradas enfileiradas tenham sido gravadas."""
+        if self._writer is not None:
+            self._queue.join()
+
+    @staticmethod
+    def match_query(query: str, any_term: bool = False) -> str:
+        """Converte texto livre em uma expressão FTS5 segura (termos entre aspas, prefixo no último)."""
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return ""
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += "*"
+        return (" OR " if any_term else " ").join(quoted)
+
+    def search(self, query: str, limit: int = 10, offset: int = 0, kind: str | None = None, any_term: bool = False) -> dict:
+        """Busca ordenada por relevância (BM25). Retorna {'total', 'results': [...]}."""
+        match = self.match_query(query, any_term)
+        if not match:
+            return {"total": 0, "results": []}
+
+        where = "entries_fts MATCH ?"
+        params = [match]
+        if kind:
+            where += " AND e.kind = ?"
+            params.append(kind)
+
+        with self._connect() as conn:
+            total = conn.execute(
+                f"SELECT count(*) FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid WHERE {where}",
+                params,
+            ).fetchone()[0]
+            rows = conn.execute(
+                "SELECT e.id, e.kind, e.task, e.source, e.prompt, e.answer, e.created_at,"
+                " snippet(entries_fts, 0, '[', ']', '…', 24), snippet(entries_fts, 2, '[', ']', '…', 32),"
+                " bm25(entries_fts, 1.0, 2.0, 1.5)"
+                f" FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid WHERE {where}"
+                " ORDER BY bm25(entries_fts, 1.0, 2.0, 1.5) LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+
+        results = [
+            {
+                "id": row[0],
+                "kind": row[1],
+                "task": row[2],
+                "source": row[3],
+                "prompt": row[4],
+                "answer": row[5],
+                "created_at": row[6],
+                "snippet": row[7],
+                "answer_snippet": row[8],
+                # bm25 é negativo: quanto menor, mais relevante
+                "score": round(-row[9], 4),
+            }
+            for row in rows
+        ]
+        return {"total": total, "results": results}
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            rows = dict(conn.execute("SELECT kind, count(*) FROM entries GROUP BY kind").fetchall())
+        with self._lock:
+            return {"entries": rows, "written": self.written, "dropped": self.dropped, "pending": self._queue.qsize()}
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    """Índice compartilhado pelo processo, configurado por variáveis de ambiente."""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = SearchIndex(
+                path=os.getenv("SEARCH_INDEX_PATH", "search_index.sqlite3"),
+                batch_size=int(os.getenv("SEARCH_INDEX_BATCH_SIZE", "64")),
+                flush_interval=float(os.getenv("SEARCH_INDEX_FLUSH_INTERVAL", "1.0")),
+            )
+        return _default_index
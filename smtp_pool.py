@@ -0,0 +1,188 @@
+import collections
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+
+class _SMTP(smtplib.SMTP):
+    """smtplib.SMTP que registra se o comando DATA da mensagem atual já foi enviado."""
+
+    data_started = False
+
+    def data(self, msg):
+        self.data_started = True
+        return super().data(msg)
+
+
+def _connection_lost(error) -> bool:
+    # Queda da conexão (ou erro de socket), e não uma recusa respondida pelo servidor
+    return isinstance(error, smtplib.SMTPServerDisconnected) or not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPPool:
+    """Pool de sessões SMTP autenticadas e reutilizáveis.
+
+    Cada conexão faz EHLO/STARTTLS/LOGIN uma única vez. Antes de ser reutilizada
+    ela é verificada com NOOP e, se tiver caído (ou ficado ociosa por tempo demais),
+    é descartada e uma nova conexão é aberta.
+
+    Uma mensagem só é reenviada se a conexão caiu antes do DATA: depois dele o
+    servidor pode já ter aceitado a mensagem, e reenviar duplicaria o e-mail.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 587,
+        user: str | None = None,
+        password: str | None = None,
+        size: int = 4,
+        timeout: float = 10,
+        max_idle: float = 120,
+        starttls: bool = True,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.starttls = starttls
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connects = 0
+        self.reuses = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = _SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.starttls:
+                server.starttls()
+                server.ehlo()
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        with self._lock:
+            self.connects += 1
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(server) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.max_idle and self._is_alive(server):
+                with self._lock:
+                    self.reuses += 1
+                return server
+            self._close(server)
+
+    @contextmanager
+    def session(self, timeout: float | None = None):
+        """Empresta uma sessão autenticada. Sessões que falharem durante o uso são descartadas."""
+        if not self._slots.acquire(timeout=timeout if timeout is not None else self.timeout):
+            raise TimeoutError("Nenhuma sessão SMTP disponível no momento.")
+        server = None
+        try:
+            server = self._checkout()
+            yield server
+        except Exception:
+            if server is not None:
+                self._close(server)
+                server = None
+            raise
+        finally:
+            if server is not None:
+                self._idle.put((server, time.monotonic()))
+            self._slots.release()
+
+    @staticmethod
+    def _send(server, msg):
+        server.data_started = False
+        return server.send_message(msg)
+
+    def send_message(self, msg):
+        """Envia uma mensagem, reconectando uma vez se a conexão caiu antes do DATA."""
+        server = None
+        try:
+            with self.session() as server:
+                return self._send(server, msg)
+        except (smtplib.SMTPException, OSError) as e:
+            if server is None or server.data_started or not _connection_lost(e):
+                raise
+        with self.session() as server:
+            return self._send(server, msg)
+
+    def send_bulk(self, messages) -> list:
+        """Envia várias mensagens pela mesma sessão. Retorna (mensagem, erro ou None) para cada uma.
+
+        O erro de uma mensagem não interrompe as seguintes. Se a conexão cair, a sessão
+        é reaberta uma vez e o envio continua; se cair de novo, as mensagens restantes
+        são marcadas com esse erro.
+        """
+        results = []
+        pending = collections.deque(messages)
+        reconnected = False
+        while pending:
+            try:
+                with self.session() as server:
+                    while pending:
+                        msg = pending[0]
+                        try:
+                            self._send(server, msg)
+                            error = None
+                        except (smtplib.SMTPException, OSError) as e:
+                            if not _connection_lost(e):
+                                error = e
+                            elif not server.data_started:
+                                # Nada foi entregue: a mensagem segue na fila para a nova sessão
+                                raise
+                            else:
+                                pending.popleft()
+                                results.append((msg, e))
+                                raise
+                        pending.popleft()
+                        results.append((msg, error))
+            except (smtplib.SMTPException, OSError) as e:
+                if reconnected:
+                    results.extend((msg, e) for msg in pending)
+                    break
+                reconnected = True
+        return results
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"idle": self._idle.qsize(), "connects": self.connects, "reuses": self.reuses}
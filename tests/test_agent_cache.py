@@ -0,0 +1,37 @@
+import threading
+import time
+
+from agent_cache import AgentCache
+
+
+def test_identical_concurrent_requests_run_the_agent_once():
+    cache = AgentCache()
+    key = AgentCache.make_key("process-image", "Texto  extraído", "resuma", "modelo", "hash")
+    calls = []
+
+    def run():
+        calls.append(1)
+        time.sleep(0.2)
+        return "resposta", key
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_run(key, run))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert [answer for answer, _ in results] == ["resposta"] * 5
+    assert cache.stats()["shared"] == 4
+    assert cache.get_or_run(key, run) == ("resposta", True)
+
+
+def test_answer_without_store_key_is_not_cached():
+    cache = AgentCache()
+    runs = iter([("resposta improvisada", None), ("resposta", "k")])
+
+    assert cache.get_or_run("k", lambda: next(runs)) == ("resposta improvisada", False)
+    assert cache.get("k") is None
+    assert cache.get_or_run("k", lambda: next(runs)) == ("resposta", False)
+    assert cache.get("k") == "resposta"
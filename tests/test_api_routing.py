@@ -0,0 +1,104 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("smolagents")
+
+# api abre o cache de OCR e o índice de busca na importação: ficam num diretório temporário
+_tmp = tempfile.mkdtemp(prefix="test_api_")
+os.environ.setdefault("OCR_CACHE_PATH", os.path.join(_tmp, "ocr_cache.sqlite3"))
+os.environ.setdefault("SEARCH_INDEX_PATH", os.path.join(_tmp, "search_index.sqlite3"))
+
+import api
+from model_router import ModelRouter
+
+from test_model_router import FakeModel
+
+RECEIPT = "Recibo de aluguel\nValor: R$ 1.500,00\nReferente a março"
+
+
+class FakeCache:
+    """Cache de respostas falso: guarda as chaves consultadas e sempre devolve um acerto."""
+
+    def __init__(self):
+        self.keys = []
+
+    def get(self, key):
+        self.keys.append(key)
+        return "resposta"
+
+    def get_or_run(self, key, run, refresh=False):
+        self.keys.append(key)
+        return "resposta", True
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = FakeCache()
+    monkeypatch.setattr(api, "agent_cache", cache)
+    return cache
+
+
+@pytest.mark.parametrize("max_local_tokens, model_id", [(6000, "local"), (5, "remote")])
+def test_process_image_plans_the_tier_from_the_prompt_token_count(monkeypatch, cache, max_local_tokens, model_id):
+    router = ModelRouter(FakeModel("local"), FakeModel("remote"), max_local_tokens=max_local_tokens)
+    monkeypatch.setattr(api, "get_agent_model", lambda: router)
+    expected = api.agent_cache_key("process-image", RECEIPT, "Qual o valor?", model_id)
+
+    answer, meta = api.run_agent_cached("process-image", RECEIPT, "Qual o valor?")
+    assert answer == "resposta"
+    assert set(meta["tokens"]) == {"ocr_text", "ocr_text_used", "prompt"}
+
+    monkeypatch.setattr(api, "extract_text_from_image", lambda data, preprocess, mode: RECEIPT)
+    events = list(api.stream_image_analysis(b"imagem", "process-image", "Qual o valor?"))
+    assert "event: error" not in "".join(events)
+
+    assert cache.keys == [expected, expected]
+
+
+class SlowModel(FakeModel):
+    """Modelo que só desiste (tempo limite do cliente HTTP) depois que o prazo da requisição acabou."""
+
+    def __call__(self, messages, **kwargs):
+        time.sleep(0.3)
+        raise TimeoutError("tempo limite do cliente HTTP")
+
+
+def test_deadline_inside_the_model_call_is_not_wrapped_by_the_agent(monkeypatch):
+    from smolagents import CodeAgent
+
+    from admission import DeadlineExceeded, reset_deadline, set_deadline
+    from agent_cache import AgentCache
+
+    router = ModelRouter(SlowModel("local"), FakeModel("remote"))
+    agent = CodeAgent(tools=[], model=router, max_steps=2)
+
+    @contextmanager
+    def pooled_agent():
+        yield agent
+
+    monkeypatch.setattr(api, "get_agent_model", lambda: router)
+    monkeypatch.setattr(api, "get_agent_pool", lambda: SimpleNamespace(agent=pooled_agent))
+    monkeypatch.setattr(api, "agent_cache", AgentCache())
+    monkeypatch.setattr(api, "extract_text_from_image", lambda data, preprocess, mode: RECEIPT)
+
+    # O prazo acaba durante a chamada ao modelo local; o roteador lança DeadlineExceeded
+    # e o smolagents a embrulha em AgentGenerationError
+    token = set_deadline(0.1)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            api.run_agent_cached("process-image", RECEIPT, "Qual o valor?")
+    finally:
+        reset_deadline(token)
+
+    token = set_deadline(0.1)
+    try:
+        events = "".join(api.stream_image_analysis(b"imagem", "process-image", "Qual o valor?"))
+    finally:
+        reset_deadline(token)
+    assert '"status": 504' in events
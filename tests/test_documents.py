@@ -0,0 +1,34 @@
+import io
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+import metrics
+from admission import reset_deadline, set_deadline, time_left
+from documents import ocr_document
+
+
+def multipage_tiff(pages: int) -> bytes:
+    frames = [Image.new("L", (40, 20), color=255) for _ in range(pages)]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format="TIFF", save_all=True, append_images=frames[1:])
+    return buffer.getvalue()
+
+
+def test_pages_run_in_the_request_context():
+    def ocr_fn(page_data):
+        # Rótulo das métricas e prazo da requisição visíveis na thread da página
+        return f"{metrics.current_endpoint()} {time_left() is not None}"
+
+    endpoint, deadline = metrics.set_endpoint("/process-document"), set_deadline(30)
+    try:
+        results = list(ocr_document(multipage_tiff(3), ocr_fn, workers=2))
+    finally:
+        reset_deadline(deadline)
+        metrics.reset_endpoint(endpoint)
+
+    assert sorted(result["page"] for result in results) == [1, 2, 3]
+    assert {result["text"] for result in results} == {"/process-document True"}
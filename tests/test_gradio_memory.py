@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("smolagents")
+
+from smolagents.memory import ActionStep, TaskStep
+from smolagents.models import MessageRole
+
+from Gradio_UI import SummaryStep, compact_agent_memory
+
+
+def turn(number: int) -> list:
+    # Um passo intermediário (saída de ferramenta) e o passo final com a resposta
+    tool_step = ActionStep(step_number=1, observations="resultado bruto da busca")
+    tool_step.action_output = f"saída da ferramenta {number}"
+    final_step = ActionStep(step_number=2)
+    final_step.action_output = f"resposta {number}"
+    return [TaskStep(task=f"pergunta {number}"), tool_step, final_step]
+
+
+def test_compacted_turns_become_a_system_summary_of_final_answers():
+    agent = SimpleNamespace(memory=SimpleNamespace(steps=turn(1) + turn(2) + turn(3) + turn(4)))
+
+    compacted = compact_agent_memory(agent, keep_turns=2)
+
+    assert compacted == 6
+    summary = agent.memory.steps[0]
+    assert isinstance(summary, SummaryStep)
+    assert summary.summary.splitlines() == ["User: pergunta 1", "Agent: resposta 1", "User: pergunta 2", "Agent: resposta 2"]
+    [message] = summary.to_messages()
+    assert message["role"] == MessageRole.SYSTEM
+    assert "New task" not in message["content"][0]["text"]
+    assert "ferramenta" not in message["content"][0]["text"]
+
+    # Uma nova compactação incorpora o resumo anterior
+    agent.memory.steps += turn(5) + turn(6)
+    compact_agent_memory(agent, keep_turns=2)
+    assert agent.memory.steps[0].summary.splitlines()[0] == "User: pergunta 1"
+    assert agent.memory.steps[0].summary.splitlines()[-1] == "Agent: resposta 4"
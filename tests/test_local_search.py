@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip("smolagents")
+
+from search_index import SearchIndex
+from tools.local_search import LocalSearchTool
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(path=str(tmp_path / "index.sqlite3"), flush_interval=0.01)
+    long_text = " ".join(["apartamento com varanda gourmet e duas vagas de garagem"] * 40)
+    index.add("k1", "analysis", text=long_text, prompt="Vale a pena?", answer="Sim. " * 400,
+              task="analyze-image", source="/analyze-image")
+    index.add("k2", "ocr", text="recibo de aluguel da casa na praia", source="/process-image")
+    index.flush()
+    return index
+
+
+def test_hits_are_capped_snippets_with_source(index):
+    tool = LocalSearchTool(index=index, max_chars=300)
+    output = tool.forward("varanda garagem")
+
+    assert "(analyze-image, /analyze-image)" in output
+    entry = output.split("### ")[1]
+    body = entry.split("\n", 1)[1]
+    assert len(body) <= 300
+    assert "[varanda]" in body
+    assert "Question: Vale a pena?" in body
+
+
+def test_no_results_points_to_the_web(index):
+    assert "Search the web" in LocalSearchTool(index=index).forward("helicóptero")
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+import metrics
+
+
+def tokens_total(direction: str) -> float:
+    return metrics._counters.get(
+        metrics._key("tokens_total", {"stage": "llm", "endpoint": "/steps", "direction": direction}), 0
+    )
+
+
+def test_step_tokens_come_from_the_step_not_the_shared_model():
+    token = metrics.set_endpoint("/steps")
+    try:
+        # Dois passos concorrentes: cada um com o `usage` da própria resposta
+        first = SimpleNamespace(duration=0.1, error=None, model_output_message=SimpleNamespace(
+            raw=SimpleNamespace(usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10))
+        ))
+        second = SimpleNamespace(duration=0.1, error=None, model_output_message=SimpleNamespace(
+            input_token_count=7, output_token_count=3, raw=None,
+        ))
+        metrics.record_agent_step(first)
+        metrics.record_agent_step(second)
+    finally:
+        metrics.reset_endpoint(token)
+
+    assert (first.input_token_count, first.output_token_count) == (100, 10)
+    assert (second.input_token_count, second.output_token_count) == (7, 3)
+    assert tokens_total("input") == 107
+    assert tokens_total("output") == 13
+
+
+def test_step_without_model_call_records_no_tokens():
+    step = SimpleNamespace(duration=None, error=None)
+    metrics.record_agent_step(step)
+    assert metrics.step_token_counts(step) == (None, None)
+    assert not hasattr(step, "input_token_count")
@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip("smolagents")
+
+from smolagents.models import ChatMessage, Model
+
+from model_router import ModelRouter
+from routing import routing_context
+
+CODE_REPLY = "Thought: pronto\nCode:\n```py\nfinal_answer('ok')\n```"
+MESSAGES = [{"role": "user", "content": "Resuma o texto extraído"}]
+
+
+class FakeModel(Model):
+    """Modelo falso: devolve uma resposta fixa (ou lança uma exceção) e guarda o timeout recebido."""
+
+    def __init__(self, model_id, reply=CODE_REPLY, error=None):
+        super().__init__()
+        self.model_id = model_id
+        self.reply = reply
+        self.error = error
+        self.calls = []
+
+    def __call__(self, messages, stop_sequences=None, timeout=None, **kwargs):
+        self.calls.append(timeout)
+        if self.error is not None:
+            raise self.error
+        self.last_input_token_count, self.last_output_token_count = 10, 5
+        return ChatMessage(role="assistant", content=self.reply)
+
+
+def route(router, task="process-image"):
+    with routing_context(task) as log:
+        message = router(MESSAGES, stop_sequences=["<end_code>"])
+    return message, log
+
+
+def test_local_task_stays_local_with_its_timeout_and_tokens():
+    local, remote = FakeModel("local"), FakeModel("remote")
+    router = ModelRouter(local, remote, timeouts={"local": 7})
+
+    message, log = route(router)
+
+    assert message.content == CODE_REPLY
+    assert (message.input_token_count, message.output_token_count) == (10, 5)
+    assert local.calls == [7] and remote.calls == []
+    assert [(entry["tier"], entry["fallback"]) for entry in log] == [("local", False)]
+
+
+def test_unparseable_local_reply_falls_back_to_remote():
+    local, remote = FakeModel("local", reply="<think>o texto fala de"), FakeModel("remote")
+    router = ModelRouter(local, remote)
+
+    message, log = route(router)
+
+    assert message.content == CODE_REPLY
+    assert [(entry["tier"], entry["ok"], entry["fallback"]) for entry in log] == [
+        ("local", False, False), ("remote", True, True)
+    ]
+
+
+def test_failed_local_tier_is_skipped_during_cooldown():
+    local, remote = FakeModel("local", error=TimeoutError("lento demais")), FakeModel("remote")
+    router = ModelRouter(local, remote, cooldown=60)
+
+    _, log = route(router)
+    assert log[0]["error"] == "lento demais"
+    assert router.stats()["local"]["healthy"] is False
+
+    # Durante o cooldown a próxima tarefa local vai direto para o remoto
+    _, log = route(router)
+    assert [entry["tier"] for entry in log] == ["remote"]
+    assert len(local.calls) == 1
+
+
+def test_last_tier_error_is_raised():
+    local, remote = FakeModel("local", error=TimeoutError("fora do ar")), FakeModel("remote", error=RuntimeError("503"))
+    router = ModelRouter(local, remote)
+
+    with pytest.raises(RuntimeError, match="503"):
+        route(router)
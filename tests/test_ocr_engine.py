@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from admission import DeadlineExceeded, reset_deadline, set_deadline
+from ocr_engine import OCREngine, OCRTimeout
+
+
+@pytest.fixture
+def engine():
+    engine = OCREngine(workers=1, queue_size=2, timeout=5)
+    engine.warmup()
+    yield engine
+    engine.shutdown()
+
+
+def test_request_deadline_stops_waiting_without_recycling(engine):
+    token = set_deadline(0.2)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            engine._get(engine.submit(time.sleep, 1))
+    finally:
+        reset_deadline(token)
+
+    assert engine.recycled == 0
+    # O job abandonado termina no mesmo pool e devolve a vaga
+    assert engine._get(engine.submit(time.sleep, 0)) is None
+    assert engine.recycled == 0
+
+
+def test_ocr_timeout_recycles_the_pool(engine):
+    with pytest.raises(OCRTimeout):
+        engine._get(engine.submit(time.sleep, 2), timeout=0.2)
+
+    assert engine.recycled == 1
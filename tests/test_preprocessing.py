@@ -0,0 +1,34 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import preprocessing
+
+
+def bradley_reference(gray, window, threshold=0.15):
+    """Bradley pixel a pixel, com a janela recortada nas bordas."""
+    half = window // 2
+    height, width = gray.shape
+    out = np.zeros_like(gray)
+    for y in range(height):
+        for x in range(width):
+            block = gray[max(0, y - half):y + half + 1, max(0, x - half):x + half + 1].astype(np.int64)
+            if int(gray[y, x]) * block.size > block.sum() * (1.0 - threshold):
+                out[y, x] = 255
+    return out
+
+
+@pytest.mark.parametrize("shape, window", [((40, 60), 15), ((9, 70), 15), ((70, 5), 31), ((3, 3), 15)])
+def test_binarize_matches_bradley_reference(shape, window):
+    gray = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+    assert np.array_equal(preprocessing.binarize(gray, window), bradley_reference(gray, window))
+
+
+def test_binarize_keeps_dark_text_on_uneven_background():
+    # Fundo em degradê com uma faixa de "texto" escuro
+    gray = np.tile(np.linspace(120, 250, 200, dtype=np.uint8), (100, 1))
+    gray[45:55, 20:180] = 30
+    binary = preprocessing.binarize(gray)
+    assert binary.dtype == np.uint8
+    assert (binary[45:55, 20:180] == 0).all()
+    assert (binary[:30] == 255).mean() > 0.9
@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+from PIL import ImageDraw, ImageFont
+
+import regions
+
+LINE = "Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod"
+
+
+def render_page(angle: float = 0.0) -> Image.Image:
+    """Página A4 (200 dpi) com um título de uma linha e um parágrafo de 10 linhas."""
+    image = Image.new("L", (1700, 2200), 255)
+    draw = ImageDraw.Draw(image)
+    draw.text((150, 150), "Apartamento a venda no centro", fill=0, font=ImageFont.load_default(size=48))
+    font = ImageFont.load_default(size=32)
+    for i in range(10):
+        draw.text((150, 400 + i * 48), LINE, fill=0, font=font)
+    return image.rotate(angle, fillcolor=255)
+
+
+def paragraph(found):
+    # O parágrafo é o maior bloco detectado
+    return max(found, key=lambda r: (r["box"][2] - r["box"][0]) * (r["box"][3] - r["box"][1]))
+
+
+def test_single_line_title_uses_line_psm():
+    found = regions.detect_regions(render_page())
+    title = min(found, key=lambda r: r["box"][1])
+    assert title["psm"] == regions.PSM_LINE
+    assert paragraph(found)["psm"] == regions.PSM_BLOCK
+
+
+@pytest.mark.parametrize("angle", [0, 1, 2, 3])
+def test_skewed_paragraph_is_not_a_single_line(angle):
+    # Inclinado, as linhas se sobrepõem no perfil horizontal; ainda assim é um bloco (PSM 6)
+    found = regions.detect_regions(render_page(angle))
+    block = paragraph(found)
+    assert block["box"][3] - block["box"][1] > 400
+    assert block["psm"] == regions.PSM_BLOCK
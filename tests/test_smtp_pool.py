@@ -0,0 +1,120 @@
+import socketserver
+import threading
+from email.message import EmailMessage
+
+import pytest
+
+from smtp_pool import SMTPPool
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Servidor SMTP mínimo de depuração: guarda as mensagens e simula falhas por destinatário.
+
+    - recusado@...: RCPT recusado com 550 (a sessão continua);
+    - cai-antes@...: a conexão cai no RCPT, na primeira vez (nada foi entregue);
+    - cai-depois@...: a mensagem é recebida, mas a conexão cai antes da resposta ao DATA.
+    """
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        self.reply("220 localhost test")
+        rcpts = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line.split(" ", 1)[0].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif command in ("NOOP", "RSET"):
+                rcpts = []
+                self.reply("250 OK")
+            elif command == "MAIL":
+                rcpts = []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                address = line.split(":", 1)[1].strip("<> ")
+                if address.startswith("recusado@"):
+                    self.reply("550 Mailbox unavailable")
+                elif address.startswith("cai-antes@") and address not in server.dropped:
+                    server.dropped.add(address)
+                    return
+                else:
+                    rcpts.append(address)
+                    self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with server.lock:
+                    server.delivered.extend(rcpts)
+                if any(r.startswith("cai-depois@") for r in rcpts):
+                    return
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPHandler)
+    server.daemon_threads = True
+    server.delivered, server.dropped, server.lock = [], set(), threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def message(to: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "suzukai@example.com"
+    msg["To"] = to
+    msg["Subject"] = "teste"
+    msg.set_content("corpo")
+    return msg
+
+
+def make_pool(smtp_server) -> SMTPPool:
+    return SMTPPool("127.0.0.1", smtp_server.server_address[1], size=1, timeout=5, starttls=False)
+
+
+def test_bulk_send_reports_each_message_and_reconnects_once(smtp_server):
+    pool = make_pool(smtp_server)
+    recipients = ["a@example.com", "recusado@example.com", "cai-antes@example.com", "b@example.com"]
+
+    results = pool.send_bulk([message(to) for to in recipients])
+
+    report = {msg["To"]: error for msg, error in results}
+    assert list(report) == recipients
+    assert report["recusado@example.com"] is not None
+    assert [to for to, error in report.items() if error is None] == [
+        "a@example.com", "cai-antes@example.com", "b@example.com"
+    ]
+    # A queda antes do DATA reabre a sessão e reenvia a mesma mensagem, sem duplicar nenhuma
+    assert sorted(smtp_server.delivered) == ["a@example.com", "b@example.com", "cai-antes@example.com"]
+    assert pool.stats()["connects"] == 2
+    pool.close()
+
+
+def test_drop_after_data_is_not_resent(smtp_server):
+    pool = make_pool(smtp_server)
+
+    results = pool.send_bulk([message("cai-depois@example.com"), message("c@example.com")])
+
+    assert results[0][1] is not None
+    assert results[1][1] is None
+    assert smtp_server.delivered == ["cai-depois@example.com", "c@example.com"]
+
+    # Envio avulso: também não repete a mensagem depois do DATA
+    with pytest.raises(Exception):
+        pool.send_message(message("cai-depois@example.com"))
+    assert smtp_server.delivered.count("cai-depois@example.com") == 2
+    pool.close()
@@ -0,0 +1,101 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("smolagents")
+pytest.importorskip("bs4")
+
+from tools import visit_webpage
+from tools.visit_webpage import VisitWebpageTool
+
+ARTICLE = (
+    "<html><head><title>Apartamento no centro</title><script>var x = 1;</script></head><body>"
+    "<nav><a href='/'>Início</a> <a href='/contato'>Contato</a></nav>"
+    "<article><h2>Detalhes</h2><p>Três quartos, varanda e duas vagas de garagem.</p></article>"
+    "<footer>Todos os direitos reservados</footer></body></html>"
+).encode()
+LAST_MODIFIED = "Wed, 01 Oct 2025 12:00:00 GMT"
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """Páginas de teste: /etag e /last-modified respondem 304 a GETs condicionais; /big é enorme."""
+
+    def log_message(self, *args):
+        pass
+
+    def send_page(self, body: bytes, **headers):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name.replace("_", "-"), value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_modified(self):
+        self.send_response(304)
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.path == "/etag":
+            if self.headers.get("If-None-Match") == '"v1"':
+                return self.not_modified()
+            return self.send_page(ARTICLE, ETag='"v1"')
+        if self.path == "/last-modified":
+            if self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                return self.not_modified()
+            return self.send_page(ARTICLE, Last_Modified=LAST_MODIFIED)
+        if self.path == "/big":
+            paragraph = b"<p>" + b"texto de preenchimento " * 40 + b"</p>"
+            return self.send_page(b"<html><body><div>" + paragraph * 2000 + b"</div></body></html>")
+        self.send_error(404)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def tool(monkeypatch):
+    monkeypatch.setattr(visit_webpage, "page_cache", visit_webpage.LRUCache(max_size=16))
+    return VisitWebpageTool()
+
+
+def url(server, path: str) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+@pytest.mark.parametrize("path, header", [("/etag", "If-None-Match"), ("/last-modified", "If-Modified-Since")])
+def test_conditional_get_reuses_the_cached_page(server, tool, path, header):
+    first = tool.forward(url(server, path))
+    second = tool.forward(url(server, path))
+
+    assert second == first
+    assert [h.get(header) for _, h in server.requests] == [None, '"v1"' if path == "/etag" else LAST_MODIFIED]
+
+
+def test_readability_keeps_the_article_and_drops_navigation(server, tool):
+    content = tool.forward(url(server, "/etag"))
+
+    assert "Apartamento no centro" in content
+    assert "Três quartos, varanda e duas vagas de garagem." in content
+    for noise in ("Contato", "direitos reservados", "var x"):
+        assert noise not in content
+
+
+def test_oversized_body_is_cut_at_the_byte_cap(server, tool, monkeypatch):
+    monkeypatch.setattr(visit_webpage, "MAX_BYTES", 64 * 1024)
+
+    content = tool.forward(url(server, "/big"))
+
+    assert content.endswith(f"(page truncated after {64 * 1024} bytes)")
+    assert content.count("texto de preenchimento") < 64 * 1024 // len("texto de preenchimento ")
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("smolagents")
+pytest.importorskip("duckduckgo_search")
+
+from cache import LRUCache
+from tools import web_search
+from tools.web_search import DuckDuckGoSearchTool
+
+
+class FakeBackend:
+    """Backend de busca falso: conta as chamadas e demora um pouco, como uma busca real."""
+
+    def __init__(self, results=None, delay=0.0):
+        self.results = results if results is not None else [
+            {"title": "Imóveis no centro", "href": "https://example.com/imoveis", "body": "Apartamentos à venda"},
+        ]
+        self.delay = delay
+        self.queries = []
+
+    def text(self, query, max_results=10):
+        self.queries.append(query)
+        time.sleep(self.delay)
+        return list(self.results[:max_results])
+
+
+@pytest.fixture(autouse=True)
+def inflight(monkeypatch):
+    monkeypatch.setattr(web_search, "search_inflight", web_search.SingleFlight())
+
+
+def test_normalized_queries_share_the_cache():
+    backend = FakeBackend()
+    tool = DuckDuckGoSearchTool(backend=backend, cache=LRUCache())
+
+    first = tool.forward("Imóveis  no Centro")
+    second = tool.forward("  imóveis no centro ")
+
+    assert second == first
+    assert "[Imóveis no centro](https://example.com/imoveis)" in first
+    assert backend.queries == ["Imóveis  no Centro"]
+
+
+def test_concurrent_identical_searches_hit_the_backend_once():
+    backend = FakeBackend(delay=0.2)
+    tool = DuckDuckGoSearchTool(backend=backend, cache=LRUCache())
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(tool.search("aluguel praia"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(backend.queries) == 1
+    assert len(results) == 5 and all(r == results[0] for r in results)
+    assert web_search.search_inflight.shared == 4
+
+
+def test_empty_results_are_not_cached():
+    backend = FakeBackend(results=[])
+    tool = DuckDuckGoSearchTool(backend=backend, cache=LRUCache())
+
+    for _ in range(2):
+        with pytest.raises(Exception, match="No results found"):
+            tool.forward("nada")
+    assert len(backend.queries) == 2
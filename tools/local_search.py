@@ -0,0 +1,49 @@
+from typing import Any, Optional
+from smolagents.tools import Tool
+
+import metrics
+from search_index import get_search_index
+
+
+def truncate(text: str, max_chars: int) -> str:
+    return text if len(text) <= max_chars else text[: max_chars - 1].rstrip() + "…"
+
+
+class LocalSearchTool(Tool):
+    name = "local_search"
+    description = (
+        "Searches previously extracted image texts and earlier answers stored locally (listings, documents, past analyses). "
+        "It is fast and free: use it when the answer may already be here, e.g. a listing or document seen before. "
+        "For new lookups on the web, use multi_web_search (or web_search for a single query)."
+    )
+    inputs = {'query': {'type': 'string', 'description': 'The search query to perform.'}}
+    output_type = "string"
+
+    def __init__(self, max_results=5, max_chars=500, index=None, **kwargs):
+        super().__init__()
+        self.max_results = max_results
+        # Cada resultado vira um trecho curto: respostas e textos inteiros encheriam o contexto do agente
+        self.max_chars = max_chars
+        self.index = index
+
+    def forward(self, query: str) -> str:
+        index = self.index if self.index is not None else get_search_index()
+        with metrics.timed("tool_local_search"):
+            # Qualquer termo basta; o BM25 coloca primeiro as entradas que casam com mais termos
+            found = index.search(query, limit=self.max_results, any_term=True)
+        if not found["results"]:
+            return "No local results found. Search the web instead."
+
+        entries = []
+        for result in found["results"]:
+            origin = result["task"] or "ocr"
+            if result["source"]:
+                origin += f", {result['source']}"
+            lines = [result["snippet"]]
+            if result["prompt"]:
+                lines.append(f"Question: {result['prompt']}")
+            if result["answer"]:
+                lines.append(f"Answer: {result['answer_snippet']}")
+            entry = "\n".join(" ".join(line.split()) for line in lines)
+            entries.append(f"### {result['kind']} #{result['id']} ({origin})\n{truncate(entry, self.max_chars)}")
+        return "## Local Results\n\n" + "\n\n".join(entries)
@@ -0,0 +1,77 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from smolagents.tools import Tool
+
+import metrics
+from tools.web_search import DuckDuckGoSearchTool
+
+# Buscas simultâneas por chamada da ferramenta
+MAX_PARALLEL = int(os.getenv("MULTI_SEARCH_PARALLEL", "4"))
+
+
+def normalize_url(url: str) -> str:
+    url = re.sub(r"^https?://(www\.)?", "", url.strip().lower())
+    return url.split("#")[0].rstrip("/")
+
+
+def compact(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[: max_chars - 1].rstrip() + "…"
+
+
+class MultiSearchTool(Tool):
+    name = "multi_web_search"
+    description = (
+        "Performs several duckduckgo web searches at once and returns the top results for each query, "
+        "with duplicate pages removed. Use it instead of calling web_search repeatedly when you need "
+        "several lookups, e.g. schools, hospitals, shops and price per m² around the same address."
+    )
+    inputs = {'queries': {'type': 'array', 'description': 'The list of search queries to perform (up to 8).'}}
+    output_type = "string"
+
+    def __init__(self, max_results=5, max_queries=8, max_parallel=None, max_chars=300, search_tool=None, **kwargs):
+        super().__init__()
+        self.max_results = max_results
+        self.max_queries = max_queries
+        self.max_parallel = max_parallel or MAX_PARALLEL
+        self.max_chars = max_chars
+        # Reaproveita o cache e a deduplicação de chamadas simultâneas do web_search
+        self.search_tool = search_tool if search_tool is not None else DuckDuckGoSearchTool(max_results=max_results, **kwargs)
+
+    def _search(self, query: str):
+        try:
+            return self.search_tool.search(query), None
+        except Exception as e:
+            return [], str(e)
+
+    def forward(self, queries: list) -> str:
+        if isinstance(queries, str):
+            queries = [queries]
+        # Remove consultas vazias e repetidas, preservando a ordem
+        unique = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))[: self.max_queries]
+        if not unique:
+            raise Exception("No queries given! Pass a list of search queries.")
+
+        with metrics.timed("tool_multi_web_search"):
+            with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(unique))) as executor:
+                found = list(executor.map(self._search, unique))
+
+        seen = set()
+        sections = []
+        for query, (results, error) in zip(unique, found):
+            lines = []
+            for result in results[: self.max_results]:
+                url = normalize_url(result.get("href", ""))
+                if url in seen:
+                    continue
+                seen.add(url)
+                lines.append(f"- [{compact(result.get('title', ''), 120)}]({result.get('href', '')}): {compact(result.get('body', ''), self.max_chars)}")
+            if error is not None:
+                lines.append(f"- Search failed: {error}")
+            elif not lines:
+                lines.append("- No new results.")
+            sections.append(f"### {query}\n" + "\n".join(lines))
+
+        return "## Search Results\n\n" + "\n\n".join(sections)
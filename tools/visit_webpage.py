@@ -1,9 +1,80 @@
+import os
+import re
+import threading
+import time
 from typing import Any, Optional
 from smolagents.tools import Tool
+from smolagents.utils import truncate_content
 import requests
+from requests.exceptions import RequestException
 import markdownify
 import smolagents
 
+import metrics
+from cache import LRUCache
+
+# Limite de bytes lidos do corpo da resposta
+MAX_BYTES = int(os.getenv("VISIT_WEBPAGE_MAX_BYTES", str(2 * 1024 * 1024)))
+
+# Respostas anteriores por URL, usadas em GETs condicionais (ETag / Last-Modified)
+page_cache = LRUCache(max_size=int(os.getenv("VISIT_WEBPAGE_CACHE_SIZE", "256")))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Sessão HTTP compartilhada, com pool de conexões (keep-alive) reaproveitado entre chamadas."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=16)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = "Mozilla/5.0 (compatible; SuzukAI/1.0)"
+            _session = session
+        return _session
+
+
+def read_limited(response, max_bytes: int) -> tuple[bytes, bool]:
+    """Lê o corpo em streaming até `max_bytes`. Retorna (corpo, foi_truncado)."""
+    chunks, size = [], 0
+    for chunk in response.iter_content(chunk_size=16384):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            return b"".join(chunks)[:max_bytes], True
+    return b"".join(chunks), False
+
+
+def extract_main_content(html: str) -> str:
+    """Extração no estilo Readability: remove navegação e ruído e mantém o bloco com mais texto."""
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        return html
+
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "iframe", "svg"]):
+        tag.decompose()
+
+    candidate = soup.find("article") or soup.find("main") or soup.find(attrs={"role": "main"})
+    if candidate is None:
+        best_score = 0
+        for element in soup.find_all(["div", "section", "td"]):
+            paragraphs = element.find_all("p", recursive=False)
+            score = sum(len(p.get_text(" ", strip=True)) for p in paragraphs)
+            if score > best_score:
+                candidate, best_score = element, score
+    if candidate is None:
+        candidate = soup.body or soup
+
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    content = str(candidate)
+    return f"<h1>{title}</h1>{content}" if title else content
+
+
 class VisitWebpageTool(Tool):
     name = "visit_webpage"
     description = "Visits a webpage at the given url and reads its content as a markdown string. Use this to browse webpages."
@@ -11,34 +82,55 @@ class VisitWebpageTool(Tool):
     output_type = "string"
 
     def forward(self, url: str) -> str:
+        start = time.perf_counter()
+        content = self._visit(url)
+        metrics.observe_stage("tool_visit_webpage", time.perf_counter() - start)
+        return content
+
+    def _visit(self, url: str) -> str:
         try:
-            import requests
-            from markdownify import markdownify
-            from requests.exceptions import RequestException
-
-            from smolagents.utils import truncate_content
-        except ImportError as e:
-            raise ImportError(
-                "You must install packages `markdownify` and `requests` to run this tool: for instance run `pip install markdownify requests`."
-            ) from e
-        try:
-            # Send a GET request to the URL with a 20-second timeout
-            response = requests.get(url, timeout=20)
-            response.raise_for_status()  # Raise an exception for bad status codes
+            cached = page_cache.get(url)
+            headers = {}
+            if cached is not None:
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
+            # Send a GET request to the URL with a 20-second timeout, reading the body as a stream
+            with get_session().get(url, timeout=20, headers=headers, stream=True) as response:
+                if response.status_code == 304 and cached is not None:
+                    return cached["content"]
+                response.raise_for_status()  # Raise an exception for bad status codes
 
-            # Convert the HTML content to Markdown
-            markdown_content = markdownify(response.text).strip()
+                body, truncated = read_limited(response, MAX_BYTES)
+                encoding = response.encoding or "utf-8"
+                html = body.decode(encoding, errors="replace")
+
+            # Keep only the main content, then convert it to Markdown
+            markdown_content = markdownify.markdownify(extract_main_content(html)).strip()
 
             # Remove multiple line breaks
             markdown_content = re.sub(r"\n{3,}", "\n\n", markdown_content)
+            if truncated:
+                markdown_content += f"\n\n(page truncated after {MAX_BYTES} bytes)"
+
+            content = truncate_content(markdown_content, 10000)
 
-            return truncate_content(markdown_content, 10000)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                page_cache.set(url, {"etag": etag, "last_modified": last_modified, "content": content})
+            return content
 
         except requests.exceptions.Timeout:
+            metrics.count_error("tool_visit_webpage")
             return "The request timed out. Please try again later or check the URL."
         except RequestException as e:
+            metrics.count_error("tool_visit_webpage")
             return f"Error fetching the webpage: {str(e)}"
         except Exception as e:
+            metrics.count_error("tool_visit_webpage")
             return f"An unexpected error occurred: {str(e)}"
 
     def __init__(self, *args, **kwargs):
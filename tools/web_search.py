@@ -1,16 +1,42 @@
+import os
+import re
 from typing import Any, Optional
 from smolagents.tools import Tool
 import duckduckgo_search
 
+import metrics
+from cache import LRUCache, SingleFlight
+
+# Cache compartilhado entre todas as instâncias da ferramenta (e, portanto, entre agentes)
+search_cache = LRUCache(
+    max_size=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "3600")),
+)
+search_inflight = SingleFlight()
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+
+def search_cache_stats() -> dict:
+    return dict(search_cache.stats(), inflight_shared=search_inflight.shared)
+
+
 class DuckDuckGoSearchTool(Tool):
     name = "web_search"
     description = "Performs a duckduckgo web search based on your query (think a Google search) then returns the top search results."
     inputs = {'query': {'type': 'string', 'description': 'The search query to perform.'}}
     output_type = "string"
 
-    def __init__(self, max_results=10, **kwargs):
+    def __init__(self, max_results=10, backend=None, cache=None, **kwargs):
         super().__init__()
         self.max_results = max_results
+        self.cache = search_cache if cache is None else cache
+        if backend is not None:
+            # Qualquer objeto com `.text(query, max_results=...)`, ex.: um backend falso para testes offline
+            self.ddgs = backend
+            return
         try:
             from duckduckgo_search import DDGS
         except ImportError as e:
@@ -19,8 +45,23 @@ class DuckDuckGoSearchTool(Tool):
             ) from e
         self.ddgs = DDGS(**kwargs)
 
+    def search(self, query: str) -> list:
+        """Resultados brutos da busca, com cache e deduplicação de chamadas simultâneas."""
+        key = (normalize_query(query), self.max_results)
+        results = self.cache.get(key)
+        if results is None:
+            results = search_inflight.do(key, self._search_uncached, key, query)
+        return results
+
+    def _search_uncached(self, key, query):
+        with metrics.timed("tool_web_search"):
+            results = list(self.ddgs.text(query, max_results=self.max_results))
+        if results:
+            self.cache.set(key, results)
+        return results
+
     def forward(self, query: str) -> str:
-        results = self.ddgs.text(query, max_results=self.max_results)
+        results = self.search(query)
         if len(results) == 0:
             raise Exception("No results found! Try a less restrictive/shorter query.")
         postprocessed_results = [f"[{result['title']}]({result['href']})\n{result['body']}" for result in results]
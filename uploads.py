@@ -0,0 +1,83 @@
+"""Leitura de uploads em um único buffer e validação barata de imagens antes da decodificação.
+
+O conteúdo de cada arquivo é lido uma única vez para um `bytes`, que é reaproveitado
+(sem cópias) para o hash do cache, o OCR e o anexo do e-mail. A validação lê apenas
+o cabeçalho da imagem, rejeitando arquivos grandes demais ou "decompression bombs"
+antes de qualquer pixel ser decodificado.
+"""
+import io
+import os
+
+# Tamanho máximo de cada arquivo enviado
+MAX_UPLOAD_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+# Limite de pixels por imagem (largura x altura); 50 MP cobre fotos de celular e páginas a 600 dpi
+MAX_IMAGE_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
+
+
+class UploadError(ValueError):
+    """Upload inválido; `status_code` é o código HTTP sugerido."""
+
+    status_code = 400
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+class ImageTooLarge(UploadTooLarge):
+    """A imagem declara dimensões acima do limite de pixels (possível decompression bomb)."""
+
+
+class InvalidImage(UploadError):
+    pass
+
+
+def read_upload(file, max_bytes: int | None = None) -> bytes:
+    """Lê o arquivo inteiro para um único buffer, lançando UploadTooLarge acima de `max_bytes`."""
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    stream = getattr(file, "stream", file)
+    # Lê um byte a mais que o limite só para detectar o excesso, sem buffers intermediários
+    data = stream.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise UploadTooLarge(f"Arquivo maior que o limite de {max_bytes / (1024 * 1024):.1f} MB.")
+    return data
+
+
+def read_attachment_bytes(file, max_bytes: int | None = None) -> tuple[bytes, str]:
+    """Lê um anexo de e-mail uma única vez: (conteúdo, nome do arquivo)."""
+    return read_upload(file, max_bytes), file.filename
+
+
+def check_image_size(width: int, height: int, max_pixels: int | None = None):
+    max_pixels = MAX_IMAGE_PIXELS if max_pixels is None else max_pixels
+    if width * height > max_pixels:
+        raise ImageTooLarge(
+            f"Imagem grande demais ({width}x{height} = {width * height / 1e6:.1f} MP; "
+            f"limite de {max_pixels / 1e6:.0f} MP)."
+        )
+
+
+def inspect_image(data: bytes, max_pixels: int | None = None) -> dict:
+    """Lê só o cabeçalho da imagem e valida formato e dimensões. Retorna {'format', 'width', 'height'}."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            image_format = image.format
+    except UnidentifiedImageError:
+        raise InvalidImage("Arquivo enviado não é uma imagem reconhecida.")
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+
+    check_image_size(width, height, max_pixels)
+    return {"format": image_format, "width": width, "height": height}
+
+
+def read_image_upload(file, max_bytes: int | None = None, max_pixels: int | None = None) -> bytes:
+    """Lê e valida uma imagem enviada; lança UploadError (ou subclasses) com mensagem clara."""
+    data = read_upload(file, max_bytes)
+    if not data:
+        raise InvalidImage("Arquivo de imagem vazio.")
+    inspect_image(data, max_pixels)
+    return data